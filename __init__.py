@@ -10,5 +10,16 @@ __version__ = '0.0.1'
 
 __all__ = [
     'clsmap',
-    "objmap.py",
+    'objmap',
+    'render',
+    'dotwriter',
+    'sampler',
+    'sizes',
+    'census',
+    'refmap',
+    'snapshot',
+    'atlas',
+    'graph',
+    'export',
+    'stats',
 ]
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+Package atlas: class graphs of a whole package tree, built in parallel.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+try:
+    from .clsmap import CPicker
+    from .graph import Graph
+    from .render import Digraph, render
+except ImportError: # run as a script
+    from clsmap import CPicker
+    from graph import Graph
+    from render import Digraph, render
+
+import importlib
+import importlib.util
+import os
+import pkgutil
+
+def _full_name(clsinfo):
+    return clsinfo.__module__ + "." + clsinfo.__name__
+
+def module_names(package):
+    ''' names of package and all modules under it, found from the files
+        without importing anything but the top package's parents '''
+    spec = importlib.util.find_spec(package)
+    if spec is None:
+        print("Err:", package, "is not found.")
+        return []
+
+    names = [package]
+    stack = [(package, spec.submodule_search_locations or [])]
+    while len(stack):
+        name, paths = stack.pop()
+        for i in pkgutil.iter_modules(paths, name + '.'):
+            names.append(i.name)
+            if i.ispkg and hasattr(i.module_finder, 'path'):
+                path = os.path.join(i.module_finder.path,
+                                    i.name.rsplit('.', 1)[1])
+                stack.append((i.name, [path]))
+    return names
+
+def module_edges(name):
+    ''' import module name and get the edges of the classes defined there,
+        edges are [child, parent] of full names like ClsMap's. Run in pool
+        workers, so errors are returned instead of raised '''
+    try:
+        module = importlib.import_module(name)
+    except BaseException as e: # SystemExit, KeyboardInterrupt by imports too
+        return name, None, "%s: %s" % (type(e).__name__, e)
+
+    classes = []
+    inherit = []
+    mro = []
+    try:
+        for value in list(vars(module).values()):
+            if not isinstance(value, type) or value.__module__ != name:
+                continue
+            clsname = _full_name(value)
+            classes.append(clsname)
+            for i in value.__bases__:
+                inherit.append([clsname, _full_name(i)])
+            for i, j in zip(value.__mro__, value.__mro__[1:]):
+                mro.append([_full_name(i), _full_name(j)])
+    except Exception as e:
+        return name, None, "%s: %s" % (type(e).__name__, e)
+
+    return name, {"classes" : classes, "inherit" : inherit, "mro" : mro}, None
+
+class Atlas():
+    ''' class graphs of every module in a package. Modules are imported
+        and inspected by a pool of processes, at most one module per
+        worker is in flight, so a worker killed by an import only takes
+        down the modules it was running, they are retried one by one in
+        fresh workers. Modules that can't be imported are kept in failed '''
+    edge_kinds = ("inherit", "mro", "subclasses")
+
+    def __init__(self, package, workers=None):
+        self.package = package
+        self.workers = workers or os.cpu_count() or 1
+        self.modules = {}
+        self.failed = {}
+
+    def __done(self, name, result, error):
+        if error is None:
+            self.modules[name] = result
+        else:
+            self.failed[name] = error
+
+    def __isolated(self, name):
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                self.__done(*pool.submit(module_edges, name).result())
+            except BrokenProcessPool:
+                self.failed[name] = "worker died while importing"
+
+    def build(self):
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+        self.modules = {}
+        self.failed = {}
+        names = module_names(self.package)
+        names.reverse() # popped in walk order
+
+        while len(names):
+            broken = []
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+            running = {}
+            try:
+                while len(names) or len(running):
+                    while len(names) and len(running) < self.workers:
+                        name = names.pop()
+                        running[pool.submit(module_edges, name)] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for i in done:
+                        name = running.pop(i)
+                        try:
+                            self.__done(*i.result())
+                        except BrokenProcessPool:
+                            broken.append(name)
+                    if len(broken):
+                        broken.extend(running.values())
+                        break
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+            for name in broken:
+                self.__isolated(name)
+
+        return self
+
+    def graph(self, kind="inherit"):
+        ''' a graph.Graph of edges of kind merged over all modules '''
+        if kind == "subclasses":
+            return self.__subclasses_graph()
+        graph = Graph()
+        for name in sorted(self.modules):
+            for i in self.modules[name][kind]:
+                graph.add_edge(i[0], i[1])
+        return graph
+
+    # what a worker saw of subclasses depends on what it had imported,
+    # inverted inherit edges of all modules are the same every run
+    def __subclasses_graph(self):
+        classes = set()
+        for i in self.modules.values():
+            classes.update(i["classes"])
+        children = {}
+        for i in self.graph("inherit").edges():
+            if classes.__contains__(i[1]):
+                children.setdefault(i[1], []).append(i[0])
+
+        graph = Graph()
+        for parent, names in children.items():
+            for i in names:
+                graph.add_edge(i, parent)
+        return graph
+
+    def edges(self, kind="inherit"):
+        return self.graph(kind).edges()
+
+    def atlas_dot(self, kinds=("inherit",), clusters=False, dot=None):
+        ''' kinds: edge kinds drawn, with their own colors if several
+            clusters: put classes in one cluster per module '''
+        if dot is None:
+            dot = Digraph(comment='Package %s class atlas' % self.package)
+        dot.attr(rankdir='LR')
+        dot.attr(splines="polyline")
+
+        if clusters:
+            if not hasattr(dot, 'subgraph'):
+                print("Warn:", dot, "can't draw clusters, ignored.")
+            else:
+                picker = CPicker()
+                for name in sorted(self.modules):
+                    classes = self.modules[name]["classes"]
+                    if not len(classes):
+                        continue
+                    with dot.subgraph(name="cluster_" + name) as sub:
+                        sub.attr(label=name, style="filled",
+                                 color=picker.picker())
+                        for i in classes:
+                            sub.node(i, label=i.rsplit('.', 1)[1])
+
+        colors = {"inherit" : "black", "mro" : "red", "subclasses" : "blue"}
+        for kind in kinds:
+            if len(kinds) == 1:
+                dot.edges(self.edges(kind))
+                continue
+            for i in self.edges(kind):
+                dot.edge(i[0], i[1], color=colors[kind])
+
+        for name in sorted(self.failed):
+            dot.node(name, label="%s\n%s" % (name, self.failed[name][:80]),
+                     shape="note", style="filled", fillcolor="Salmon")
+        return dot
+
+    # filename None returns the image data instead of writing files
+    def draw_atlas(self, filename="atlas.gv", format="png", kinds=("inherit",),
+                   clusters=False, save_source=True):
+        dot = self.atlas_dot(kinds, clusters)
+        return render(dot, filename, format, save_source)
+
+def test():
+    atlas = Atlas("json").build()
+    print(len(atlas.modules), "modules", len(atlas.failed), "failed")
+    atlas.draw_atlas(clusters=True)
+
+if __name__ == '__main__':
+    test()
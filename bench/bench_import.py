@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+Import time benchmark: python bench/bench_import.py [repeat]
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+''' modules timed, and the heavy ones they shouldn't import '''
+MODULES = ('clsmap', 'objmap', 'render', 'sizes', 'census', 'snapshot',
+           'refmap', 'atlas', 'sampler')
+HEAVY = ('graphviz', 'asyncio', 'concurrent.futures.thread')
+
+PROBE = '''import sys, time
+t = time.perf_counter()
+import %s
+t = time.perf_counter() - t
+print(t, ",".join(i for i in %r if i in sys.modules))
+'''
+
+def import_time(module):
+    ''' seconds to import module in a fresh interpreter, and the heavy
+        modules pulled in by it '''
+    out = subprocess.run([sys.executable, '-c', PROBE % (module, HEAVY)],
+                         cwd=ROOT, check=True, capture_output=True,
+                         text=True).stdout.split()
+    return float(out[0]), out[1] if len(out) > 1 else ""
+
+def main(repeat=5):
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', ROOT],
+                   check=True)
+    print("%-10s %10s  %s" % ("module", "best ms", "heavy imports"))
+    for module in MODULES:
+        times = []
+        for i in range(repeat):
+            t, heavy = import_time(module)
+            times.append(t)
+        print("%-10s %10.2f  %s" % (module, min(times) * 1000, heavy or "-"))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
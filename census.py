@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+Heap-wide instance census per class, drawn over ClsMap maps.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import gc
+import sys
+
+class Census():
+    ''' live instances and their shallow bytes per class, counted in one
+        linear pass over gc.get_objects() into dicts keyed by type.
+        Only objects tracked by gc are seen: instances of user classes
+        and containers, but not ints, strings and the like '''
+    def __init__(self):
+        self.counts = {}
+        self.sizes = {}
+        self.objects = 0
+        self.__subtrees = {}
+
+    @classmethod
+    def take(cls):
+        census = cls()
+        counts = census.counts
+        sizes = census.sizes
+        getsizeof = sys.getsizeof
+
+        objects = gc.get_objects()
+        for i in objects:
+            t = type(i)
+            counts[t] = counts.get(t, 0) + 1
+            sizes[t] = sizes.get(t, 0) + getsizeof(i, 0)
+        census.objects = len(objects)
+        del objects
+
+        return census
+
+    def count(self, clsinfo):
+        return self.counts.get(clsinfo, 0)
+
+    def size(self, clsinfo):
+        return self.sizes.get(clsinfo, 0)
+
+    def subtree(self, clsinfo):
+        ''' (count, bytes) of clsinfo and all its subclasses, a class
+            reached by several bases is counted once '''
+        total = self.__subtrees.get(clsinfo)
+        if total is None:
+            total = self.__subtrees[clsinfo] = self.subtrees(clsinfo)[clsinfo]
+        return total
+
+    def subtrees(self, clsinfo):
+        ''' subtree() of clsinfo and of every class below it, summed up
+            from the leaves in one walk. A class reached by several bases
+            is counted once, under the base it is reached from first '''
+        order = []    # parents before their children
+        parents = {id(clsinfo): None}
+        stack = [clsinfo]
+        while len(stack):
+            i = stack.pop()
+            order.append(i)
+            for j in type.__subclasses__(i):
+                if not parents.__contains__(id(j)):
+                    parents[id(j)] = i
+                    stack.append(j)
+
+        sums = {}     # id(cls) -> [count, bytes] of its subtree
+        totals = {}
+        for i in reversed(order):
+            total = sums.pop(id(i), [0, 0])
+            total[0] += self.counts.get(i, 0)
+            total[1] += self.sizes.get(i, 0)
+            totals[i] = tuple(total)
+            parent = parents[id(i)]
+            if parent is not None:
+                up = sums.setdefault(id(parent), [0, 0])
+                up[0] += total[0]
+                up[1] += total[1]
+        return totals
+
+    def top(self, n=20):
+        ''' the n classes holding most bytes, as (class, count, bytes) '''
+        biggest = sorted(self.sizes, key=self.sizes.__getitem__, reverse=True)
+        return [(i, self.counts[i], self.sizes[i]) for i in biggest[:n]]
@@ -25,7 +25,33 @@ Released under the MIT licence.
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from graphviz import Digraph
+
+try:
+    from .graph import Graph
+    from .render import Digraph, render
+    from .sizes import size_str
+    from .stats import count, timed
+except ImportError: # run as a script
+    from graph import Graph
+    from render import Digraph, render
+    from sizes import size_str
+    from stats import count, timed
+
+import math
+import sys
+import weakref
+
+class _shared_picker():
+    ''' picker of an instance picks from it, CPicker.picker() from the
+        picker shared by the class, as it did when picker was a classmethod '''
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            obj = cls.default()
+        return self.func.__get__(obj, cls)
 
 ''' picker on X11 color different from last time '''
 class CPicker():
@@ -67,49 +93,56 @@ class CPicker():
               (len(__greys), __greys),
               (len(__reds), __reds),)
 
-    rotate_index = {"cindex": 0, "index" : 0}
-    order_index = 0
     total_len = 0
     colors_num = len(colors)
     
     for i in range(colors_num):
         total_len += colors[i][0]
 
+    ''' indexes belong to the picker, so a new picker always gives the
+        same colors whatever was picked before or in other threads '''
+    def __init__(self):
+        self.rotate_index = {"cindex": 0, "index" : 0}
+        self.order_index = 0
+        self.cname_index = {}
+
     @classmethod
-    def __single_picker(cls, cname):
-        if not cls.cnames.__contains__(cname):
+    def default(cls):
+        ''' the picker shared by the callers of CPicker.picker() '''
+        if not cls.__dict__.__contains__('_default'):
+            cls._default = cls()
+        return cls._default
+
+    def __single_picker(self, cname):
+        if not self.cnames.__contains__(cname):
             return
         
-        index_name = cname + "_index"
-        if not cls.cnames.__contains__(index_name):
-            cls.cnames[index_name] = 0
-        
-        index = cls.cnames[index_name]
-        cls.cnames[index_name] += 1
-        return cls.cnames[cname][index % len(cls.cnames[cname])]
+        index = self.cname_index.get(cname, 0)
+        self.cname_index[cname] = index + 1
+        return self.cnames[cname][index % len(self.cnames[cname])]
 
     ''' support method: order, rotate, red, green, brown ,set39 and grey'''
-    @classmethod
-    def picker(cls, method="set312"):
+    @_shared_picker
+    def picker(self, method="set312"):
         color = "white"
         if method == "rotate":
-            cindex = cls.rotate_index["cindex"] % len(cls.colors)
-            index = cls.rotate_index["index"] % cls.colors[cindex][0]
-            color = cls.colors[cindex][1][index]
-            cls.rotate_index["cindex"] += 1
-            if cls.rotate_index["cindex"] % cls.colors_num == 0:
-                cls.rotate_index["index"] += 1
+            cindex = self.rotate_index["cindex"] % len(self.colors)
+            index = self.rotate_index["index"] % self.colors[cindex][0]
+            color = self.colors[cindex][1][index]
+            self.rotate_index["cindex"] += 1
+            if self.rotate_index["cindex"] % self.colors_num == 0:
+                self.rotate_index["index"] += 1
         elif method == "order":
-            index = cls.order_index % cls.total_len
-            for i in range(cls.colors_num):
-                if index - cls.colors[i][0] >= 0:
-                    index -= cls.colors[i][0]
+            index = self.order_index % self.total_len
+            for i in range(self.colors_num):
+                if index - self.colors[i][0] >= 0:
+                    index -= self.colors[i][0]
                 else:
-                    color = cls.colors[i][1][index]
+                    color = self.colors[i][1][index]
                     break
-            cls.order_index += 1
+            self.order_index += 1
         else:
-            newcolor = cls.__single_picker(method)
+            newcolor = self.__single_picker(method)
             if newcolor:
                 color = newcolor
         return color
@@ -150,172 +183,484 @@ class ClsMap():
         rindex = node.rfind('.')
         return node[rindex + 1:]
 
+    # full names edges to a graph, modules are kept in its column
     @staticmethod
-    def __edges_rm_module_name(edges):
-        newedges = []
+    def __full_names_graph(edges):
+        graph = Graph()
         for i in edges:
-            newedges.append([ClsMap.__node_last_name(i[0]), 
-                             ClsMap.__node_last_name(i[1])])
+            graph.add_edge_ids(
+                graph.add_node(i[0], module=ClsMap.__node_module_name(i[0])),
+                graph.add_node(i[1], module=ClsMap.__node_module_name(i[1])))
+        return graph
 
-        return newedges 
-    
-    @staticmethod
-    def __edges_in_same_module(edges):
-        for i in edges:
-            if ClsMap.__node_module_name(i[1]) != ClsMap.__node_module_name(i[0]):
-                return False
+    ''' direct base edges of every walked class, shared by all maps '''
+    __inherit_cache = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def cache_clear(cls):
+        ''' forget cached edges, needed only if __bases__ was reassigned '''
+        ClsMap.__inherit_cache.clear()
 
-        return True
-    
-    # may have duplicate paths
     @staticmethod
-    def __inherit_edges_get(clsinfo):
-        edges = []
-
-        for i in (clsinfo.__bases__):
-            edges.append([clsinfo.__name__, i.__name__])
-            if i != object:
-                subedges = ClsMap.__inherit_edges_get(i)
-                if len(subedges):
-                    edges.extend(subedges)
-        
+    def __base_edges(clsinfo):
+        try:
+            edges = ClsMap.__inherit_cache.get(clsinfo)
+        except TypeError: # unhashable class
+            edges = None
+        if edges is None:
+            edges = tuple((clsinfo.__name__, i.__name__)
+                          for i in clsinfo.__bases__)
+            try:
+                ClsMap.__inherit_cache[clsinfo] = edges
+            except TypeError:
+                pass
         return edges
-    
-    # remove duplicate paths
+
+    # depth first from clsinfo, every class is expanded once. An explicit
+    # stack, so deep hierarchies can't exceed the recursion limit
     @staticmethod
-    def __edges_dup_remove(edges):
-        new_edges = []
-        for i in edges:
-            if i in new_edges:
+    def __inherit_edges_get(clsinfo):
+        found = {}
+        seen = set()
+        stack = [(None, clsinfo)]
+        while len(stack):
+            edge, cls = stack.pop()
+            if edge is not None:
+                found[edge] = None
+            if cls is object or id(cls) in seen:
                 continue
-            new_edges.append(i)
-
-        return new_edges
+            seen.add(id(cls))
+            stack.extend(reversed(list(zip(ClsMap.__base_edges(cls),
+                                           cls.__bases__))))
+        return tuple(found)
     
+    ''' *_graph methods return a graph.Graph of the edges, *_edges ones
+        the [child, parent] name lists of it '''
     @classmethod
-    def inherit_edges(cls, clsinfo):
+    @timed("edges")
+    def inherit_graph(cls, clsinfo):
+        graph = Graph()
         if not ClsMap.__is_cls(clsinfo):
-            return []
-        edges = ClsMap.__inherit_edges_get(clsinfo)
-        return ClsMap.__edges_dup_remove(edges)
+            return graph
+
+        for i in clsinfo.__mro__:
+            graph.add_node(i.__name__, module=ClsMap.__module_name(i))
+        for i in ClsMap.__inherit_edges_get(clsinfo):
+            graph.add_edge(i[0], i[1])
+        return graph
+
+    @classmethod
+    def inherit_edges(cls, clsinfo):
+        return cls.inherit_graph(clsinfo).edges()
     
     @classmethod
-    def mro_edges(cls, clsinfo):
+    @timed("edges")
+    def mro_graph(cls, clsinfo):
+        graph = Graph()
         if not ClsMap.__is_cls(clsinfo):
-            return []
-        
-        edges = []
-        start = clsinfo.__mro__[0].__name__
-    
+            return graph
+
+        start = graph.add_node(clsinfo.__mro__[0].__name__,
+                               module=ClsMap.__module_name(clsinfo))
         for i in clsinfo.__mro__[1:]:
-            edges.append([start, i.__name__])
-            start = i.__name__
-    
-        return edges
-    
+            node = graph.add_node(i.__name__, module=ClsMap.__module_name(i))
+            graph.add_edge_ids(start, node)
+            start = node
+        return graph
+
     @classmethod
-    def subclasses_edges(cls, clsinfo):
-        def __subclasses_edges(cls, clsinfo):
-            edges = []
-            
-            try:
-                subclasses = clsinfo.__subclasses__()
-            except TypeError:
-                subclasses = clsinfo.__subclasses__(type)
+    def mro_edges(cls, clsinfo):
+        return cls.mro_graph(clsinfo).edges()
     
+    ''' subclasses index: class -> (generation, edges of its subtree).
+        Entries are valid while generation is unchanged, it's increased by
+        class creation (once tracked) and by destruction of indexed classes '''
+    __subclasses_cache = {}
+    __generation = 0
+    __tracking = False
+    __build_class = None
+
+    @classmethod
+    def subclasses_invalidate(cls):
+        ''' drop the subclasses index, e.g. after classes made by type() '''
+        ClsMap.__generation += 1
+
+    @classmethod
+    def track_classes(cls, enable=True):
+        ''' keep the subclasses index across calls, every class statement
+            executed later invalidates it. Without tracking the index only
+            lives during one subclasses_edges call '''
+        import builtins
+
+        if enable == ClsMap.__tracking:
+            return
+
+        if enable:
+            build_class = builtins.__build_class__
+            def tracked_build_class(*args, **kwargs):
+                newcls = build_class(*args, **kwargs)
+                ClsMap.__generation += 1
+                return newcls
+            ClsMap.__build_class = build_class
+            builtins.__build_class__ = tracked_build_class
+        else:
+            builtins.__build_class__ = ClsMap.__build_class
+            ClsMap.__build_class = None
+
+        ClsMap.__tracking = enable
+        ClsMap.subclasses_invalidate()
+
+    @staticmethod
+    def __subclasses_forget(ref):
+        ClsMap.__subclasses_cache.pop(ref, None)
+        ClsMap.__generation += 1
+
+    @staticmethod
+    def __subclasses_cached(clsinfo):
+        try:
+            entry = ClsMap.__subclasses_cache.get(weakref.ref(clsinfo))
+        except TypeError: # unhashable class
+            return None
+        if entry is None or entry[0] != ClsMap.__generation:
+            return None
+        return entry[1]
+
+    @staticmethod
+    def __subclasses_store(clsinfo, edges):
+        try:
+            ref = weakref.ref(clsinfo, ClsMap.__subclasses_forget)
+            ClsMap.__subclasses_cache[ref] = (ClsMap.__generation, edges)
+        except TypeError:
+            pass
+
+    @staticmethod
+    def __full_name(clsinfo):
+        return clsinfo.__module__ + "." + clsinfo.__name__
+
+    # iterative depth first walk, every class is expanded once and its
+    # subtree edges are kept in the index for later walks
+    @staticmethod
+    def __subclasses_edges_get(clsinfo):
+        edges = ClsMap.__subclasses_cached(clsinfo)
+        if edges is not None:
+            return edges
+
+        # type.__subclasses__ also works with metaclasses
+        stack = [(clsinfo, iter(type.__subclasses__(clsinfo)), {})]
+        onstack = {id(clsinfo)}
+        while len(stack):
+            node, subclasses, found = stack[-1]
             for i in subclasses:
-                if clsinfo == i:
-                    print("Warn:", clsinfo, "looped itself!")
+                if id(i) in onstack:
+                    print("Warn:", i, "looped itself!")
                     continue
-    
-                edges.append([i.__module__ + "." + i.__name__, \
-                              clsinfo.__module__ + "." + clsinfo.__name__])
-                subedges = cls.subclasses_edges(i)
-                if len(subedges):
-                    edges.extend(subedges)
-    
-            return edges
-        
-        return ClsMap.__edges_dup_remove(__subclasses_edges(cls, clsinfo))
 
+                found[(ClsMap.__full_name(i), ClsMap.__full_name(node))] = None
+                subedges = ClsMap.__subclasses_cached(i)
+                if subedges is None:
+                    stack.append((i, iter(type.__subclasses__(i)), {}))
+                    onstack.add(id(i))
+                    break
+                found.update(dict.fromkeys(subedges))
+            else:
+                stack.pop()
+                onstack.discard(id(node))
+                edges = tuple(found)
+                ClsMap.__subclasses_store(node, edges)
+                if len(stack):
+                    stack[-1][2].update(dict.fromkeys(edges))
+
+        return edges
+
+    @staticmethod
+    def __module_match(module, prefixes):
+        for i in prefixes:
+            if module == i or module.startswith(i + '.'):
+                return True
+        return False
+
+    ''' top module name -> True if it's installed as a third-party package '''
+    __thirdparty_modules = {}
+
+    @staticmethod
+    def __is_thirdparty(module):
+        top = module.split('.')[0]
+        if not ClsMap.__thirdparty_modules.__contains__(top):
+            path = getattr(sys.modules.get(top), '__file__', None) or ""
+            ClsMap.__thirdparty_modules[top] = 'site-packages' in path \
+                                               or 'dist-packages' in path
+        return ClsMap.__thirdparty_modules[top]
+
+    # node name of a subclass, None if it's filtered out
+    @staticmethod
+    def __pruned_name(clsinfo, include, exclude, collapse_thirdparty):
+        module = clsinfo.__module__
+        if include and not ClsMap.__module_match(module, include):
+            return None
+        if exclude and ClsMap.__module_match(module, exclude):
+            return None
+        if collapse_thirdparty and ClsMap.__is_thirdparty(module):
+            return module.split('.')[0] + ".*"
+        return ClsMap.__full_name(clsinfo)
+
+    # breadth first walk, subclasses filtered out are never expanded
+    @staticmethod
+    def __subclasses_edges_pruned(clsinfo, include, exclude, max_depth,
+                                  max_nodes, collapse_thirdparty):
+        edges = {}
+        nodes = {ClsMap.__full_name(clsinfo): None}
+        names = {id(clsinfo): ClsMap.__full_name(clsinfo)}
+        level = [clsinfo]
+        depth = 0
+
+        while len(level) and (max_depth is None or depth < max_depth):
+            depth += 1
+            nextlevel = []
+            for node in level:
+                for i in type.__subclasses__(node):
+                    if names.__contains__(id(i)): # reached from another base
+                        if names[id(i)] in nodes:
+                            edges[(names[id(i)], names[id(node)])] = None
+                        continue
+
+                    name = ClsMap.__pruned_name(i, include, exclude,
+                                                collapse_thirdparty)
+                    names[id(i)] = name
+                    if name is None:
+                        continue
+                    if not nodes.__contains__(name):
+                        if max_nodes is not None and len(nodes) >= max_nodes:
+                            continue
+                        nodes[name] = None
+
+                    edges[(name, names[id(node)])] = None
+                    if not name.endswith(".*"): # collapsed packages stop here
+                        nextlevel.append(i)
+            level = nextlevel
+
+        return tuple(edges)
+
+    ''' Filters are applied while walking:
+        include/exclude: module name prefixes of subclasses to keep/skip
+        max_depth: levels of subclasses below clsinfo
+        max_nodes: number of classes in the map, clsinfo included
+        collapse_thirdparty: draw classes of an installed package as one
+                             node like "django.*" and don't expand them '''
     @classmethod
-    def draw_mro(cls, clsinfo, filename="mro.gv", format="png"):
+    @timed("edges")
+    def subclasses_graph(cls, clsinfo, include=None, exclude=None,
+                         max_depth=None, max_nodes=None,
+                         collapse_thirdparty=False):
         if not ClsMap.__is_cls(clsinfo):
-            return
+            return Graph()
+
+        if include or exclude or max_depth is not None \
+           or max_nodes is not None or collapse_thirdparty:
+            edges = ClsMap.__subclasses_edges_pruned(clsinfo, include,
+                                                     exclude, max_depth,
+                                                     max_nodes,
+                                                     collapse_thirdparty)
+            return ClsMap.__full_names_graph(edges)
+
+        if not ClsMap.__tracking:
+            ClsMap.subclasses_invalidate()
+        return ClsMap.__full_names_graph(ClsMap.__subclasses_edges_get(clsinfo))
+
+    @classmethod
+    def subclasses_edges(cls, clsinfo, include=None, exclude=None,
+                         max_depth=None, max_nodes=None,
+                         collapse_thirdparty=False):
+        return cls.subclasses_graph(clsinfo, include, exclude, max_depth,
+                                    max_nodes, collapse_thirdparty).edges()
+
+    ''' *_dot methods build the graphviz graph of a map without rendering
+        it, None is returned if there's nothing to draw. Pass dot to add
+        the map to an existing graph like a DotWriter. draw_* methods
+        render it, with filename None the image data is returned instead
+        of written to files '''
+    @classmethod
+    @timed("build")
+    def mro_dot(cls, clsinfo, dot=None):
+        if not ClsMap.__is_cls(clsinfo):
+            return None
 
         mro_edges = cls.mro_edges(clsinfo)
         if not len(mro_edges):
-            return
+            return None
 
         clsinfo_name = ClsMap.__cls_name(clsinfo)
-        dot = Digraph(comment='Class %s MRO map' % clsinfo_name)
+        if dot is None:
+            dot = Digraph(comment='Class %s MRO map' % clsinfo_name)
         # Rank directions: "TB", "LR", "BT", "RL"
         dot.attr(rankdir='LR')
-        dot.edge_attr.update(color='red')
+        dot.attr('edge', color='red')
         dot.node(mro_edges[0][0], style="filled")
         dot.edges(mro_edges)
-        dot.render(filename, format=format, view=False)
+        count("nodes", len(mro_edges) + 1)
+        count("edges", len(mro_edges))
+        return dot
 
     @classmethod
-    def draw_map(cls, clsinfo, filename="map.gv", format="png", with_mro=False):
-        if not ClsMap.__is_cls(clsinfo):
+    def draw_mro(cls, clsinfo, filename="mro.gv", format="png",
+                 save_source=True):
+        dot = cls.mro_dot(clsinfo)
+        if dot is None:
             return
 
+        return render(dot, filename, format, save_source)
+
+    # draw census numbers on nodes, classes maps node names to classes,
+    # with a root also the subtree totals of the classes below it
+    @staticmethod
+    def __census_overlay(dot, classes, census, root=None):
+        subtree = root is not None
+        totals = census.subtrees(root) if subtree else {}
+        stats = {}
+        for name, clsinfo in classes.items():
+            stats[name] = (census.count(clsinfo), census.size(clsinfo))
+            if subtree:
+                stats[name] += totals.get(clsinfo, (0, 0))
+        if not len(stats):
+            return
+
+        biggest = max(max(i[-1] for i in stats.values()), 1)
+        for name, i in stats.items():
+            label = "%s\n%d objs %s" % (ClsMap.__node_last_name(name), i[0],
+                                        size_str(i[1]))
+            if subtree:
+                label += "\nsubtree %d objs %s" % (i[2], size_str(i[3]))
+            index = int(6 * math.log1p(i[-1]) / math.log1p(biggest))
+            dot.node(name, label=label, style="filled",
+                     fillcolor=CPicker.ylorbr9[index])
+
+    ''' census: a census.Census drawn over the nodes, instance counts and
+        bytes are shown and nodes are colored by bytes '''
+    @classmethod
+    @timed("build")
+    def map_dot(cls, clsinfo, with_mro=False, dot=None, census=None):
+        if not ClsMap.__is_cls(clsinfo):
+            return None
+
         clsinfo_name = ClsMap.__cls_name(clsinfo)
-        dot = Digraph(comment='Class %s inherit relationship map' % clsinfo_name)
+        if dot is None:
+            dot = Digraph(comment='Class %s inherit relationship map'
+                                  % clsinfo_name)
 
         if clsinfo == object:
-            edges = [["object", "NUL"]]
+            graph = Graph.from_edges([["object", "NUL"]])
         else:
-            edges = cls.inherit_edges(clsinfo)
+            graph = cls.inherit_graph(clsinfo)
 
+        edges = graph.edges()
         dot.node(edges[0][0], style="filled")
+        count("nodes", len(graph))
+        count("edges", len(edges))
         if not with_mro:
             dot.edges(edges)
         else:
-            mro_edges = cls.mro_edges(clsinfo)
+            mro = cls.mro_graph(clsinfo)
             for i in edges:
-                if i in mro_edges:
-                    mro_edges.remove(i)
+                if mro.has_edge(i[0], i[1]):
                     dot.edge(i[0], i[1], color='red')
                 else:
                     dot.edge(i[0], i[1])
-            for i in mro_edges:
-                dot.edge(i[0], i[1], color='red')
+            for i in mro.edges():
+                if not graph.has_edge(i[0], i[1]):
+                    dot.edge(i[0], i[1], color='red')
+                    count("edges")
 
-        dot.render(filename, format=format, view=False)
+        if census is not None:
+            classes = dict((i.__name__, i) for i in reversed(clsinfo.__mro__))
+            ClsMap.__census_overlay(dot, classes, census)
+
+        return dot
+
+    @classmethod
+    def draw_map(cls, clsinfo, filename="map.gv", format="png", with_mro=False,
+                 save_source=True, census=None):
+        dot = cls.map_dot(clsinfo, with_mro, census=census)
+        if dot is None:
+            return
+
+        return render(dot, filename, format, save_source)
         
     @classmethod
-    def draw_subclasses(cls, clsinfo, filename="subclasses.gv", format="png"):
+    @timed("build")
+    def subclasses_dot(cls, clsinfo, include=None, exclude=None,
+                       max_depth=None, max_nodes=None,
+                       collapse_thirdparty=False, dot=None, census=None):
         if not ClsMap.__is_cls(clsinfo):
-            return
+            return None
 
-        edges = cls.subclasses_edges(clsinfo)
-        if not len(edges):
-            return
+        graph = cls.subclasses_graph(clsinfo, include, exclude, max_depth,
+                                     max_nodes, collapse_thirdparty)
+        if not graph.edge_count():
+            return None
         
         multiple_modules = True
-        if ClsMap.__edges_in_same_module(edges):
-            edges = ClsMap.__edges_rm_module_name(edges)
+        if graph.module_count() == 1:
+            graph = graph.relabel(ClsMap.__node_last_name)
             multiple_modules = False
+        edges = graph.edges()
         clsinfo_name = ClsMap.__cls_name(clsinfo)
-        dot = Digraph(comment='Class %s subclasses tree' % clsinfo_name)
+        if dot is None:
+            dot = Digraph(comment='Class %s subclasses tree' % clsinfo_name)
         dot.attr(rankdir='LR')
         dot.attr(splines="polyline")
         dot.node(edges[0][1], style="filled")
 
         if multiple_modules: # add node color for different modules
+            picker = CPicker() # colors of this render only
             color_plate = {}
-            for edge in edges:
-                for node in edge:
-                    module_name = ClsMap.__node_module_name(node)
-                    if not color_plate.__contains__(module_name):
-                        color_plate[module_name] = CPicker.picker()
-
-                    dot.node(node, style='filled', fillcolor=color_plate[module_name])
+            drawn = set()
+            for nid in (i for edge in graph.edge_ids() for i in edge):
+                if nid in drawn:
+                    continue
+                drawn.add(nid)
+                node = graph.names[nid]
+                module_name = graph.module(node)
+                if not color_plate.__contains__(module_name):
+                    color_plate[module_name] = picker.picker()
+                graph.add_node(node, style=color_plate[module_name])
+
+                dot.node(node, style='filled', fillcolor=graph.style(node))
  
         dot.edges(edges)
-        dot.render(filename, format=format, view=False)
+        count("nodes", len(graph))
+        count("edges", len(edges))
+
+        if census is not None: # counts are aggregated up the subtrees
+            names = graph.ids
+            classes = {}
+            stack = [clsinfo]
+            seen = {id(clsinfo)}
+            while len(stack):
+                i = stack.pop()
+                name = ClsMap.__full_name(i)
+                if not multiple_modules:
+                    name = ClsMap.__node_last_name(name)
+                if name in names:
+                    classes[name] = i
+                for j in type.__subclasses__(i):
+                    if id(j) not in seen:
+                        seen.add(id(j))
+                        stack.append(j)
+            ClsMap.__census_overlay(dot, classes, census, clsinfo)
+
+        return dot
+
+    @classmethod
+    def draw_subclasses(cls, clsinfo, filename="subclasses.gv", format="png",
+                        include=None, exclude=None, max_depth=None,
+                        max_nodes=None, collapse_thirdparty=False,
+                        save_source=True, census=None):
+        dot = cls.subclasses_dot(clsinfo, include, exclude, max_depth,
+                                 max_nodes, collapse_thirdparty,
+                                 census=census)
+        if dot is None:
+            return
+
+        return render(dot, filename, format, save_source)
 
 def test():
     class A():
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming DOT writer, a drop-in sink for the ClsMap, ObjMap and StackMap
+graph builders.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import re
+
+''' quoting rules are the same as the graphviz package uses '''
+_html = re.compile(r'<.*>$', re.DOTALL)
+_id = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$')
+_quote = re.compile(r'(?P<bs>(?:\\{2})*)\\?(?P<q>")')
+_keywords = {'node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'}
+
+def quote(identifier):
+    ''' return DOT identifier from string, quoted if needed '''
+    identifier = str(identifier)
+    if _html.match(identifier):
+        return identifier
+    if not _id.match(identifier) or identifier.lower() in _keywords:
+        return '"%s"' % _quote.sub(r'\g<bs>\\\g<q>', identifier)
+    return identifier
+
+def quote_edge(identifier):
+    ''' quote an edge end like 'node:port:compass' '''
+    node, _, rest = identifier.partition(':')
+    parts = [quote(node)]
+    if rest:
+        port, _, compass = rest.partition(':')
+        parts.append(quote(port))
+        if compass:
+            parts.append(compass)
+    return ':'.join(parts)
+
+def attr_list(label=None, attrs=None):
+    items = []
+    if label is not None:
+        items.append('label=' + quote(label))
+    if attrs:
+        for k, v in sorted(attrs.items()):
+            if v is not None:
+                items.append('%s=%s' % (quote(k), quote(v)))
+    if not len(items):
+        return ''
+    return ' [%s]' % ' '.join(items)
+
+class DotWriter():
+    ''' write a digraph to the file-like object fp statement by statement,
+        nothing is buffered, so memory stays flat however big the graph is.
+        It has the subset of graphviz.Digraph used by the *_dot builders:
+            with open("map.gv", "w") as fp, DotWriter(fp) as dot:
+                ClsMap.map_dot(clsinfo, dot=dot) '''
+    def __init__(self, fp, name=None, comment=None, graph_attr=None,
+                 node_attr=None, edge_attr=None, strict=False):
+        self.fp = fp
+        self.closed = False
+
+        if comment is not None:
+            fp.write('// %s\n' % comment)
+        head = 'strict digraph' if strict else 'digraph'
+        if name:
+            head += ' ' + quote(name)
+        fp.write(head + ' {\n')
+        for kw, attrs in (('graph', graph_attr), ('node', node_attr),
+                          ('edge', edge_attr)):
+            if attrs:
+                fp.write('\t%s%s\n' % (kw, attr_list(attrs=attrs)))
+
+    def attr(self, kw=None, _attributes=None, **attrs):
+        if _attributes:
+            attrs.update(_attributes)
+        if kw is None:
+            for k, v in attrs.items():
+                self.fp.write('\t%s=%s\n' % (quote(k), quote(v)))
+        else:
+            self.fp.write('\t%s%s\n' % (kw, attr_list(attrs=attrs)))
+
+    def node(self, name, label=None, _attributes=None, **attrs):
+        if _attributes:
+            attrs.update(_attributes)
+        self.fp.write('\t%s%s\n' % (quote(name), attr_list(label, attrs)))
+
+    def edge(self, tail_name, head_name, label=None, _attributes=None,
+             **attrs):
+        if _attributes:
+            attrs.update(_attributes)
+        self.fp.write('\t%s -> %s%s\n' % (quote_edge(tail_name),
+                                           quote_edge(head_name),
+                                           attr_list(label, attrs)))
+
+    def edges(self, tail_head_iter):
+        write = self.fp.write
+        for tail, head in tail_head_iter:
+            write('\t%s -> %s\n' % (quote_edge(tail), quote_edge(head)))
+
+    def close(self):
+        ''' end the graph, fp itself is left open '''
+        if not self.closed:
+            self.fp.write('}\n')
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
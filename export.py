@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming exports of map graphs: JSON Lines, CSV edge lists and columns.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+try:
+    from .graph import Graph
+except ImportError: # run as a script
+    from graph import Graph
+
+from array import array
+
+import csv
+import json
+import struct
+import sys
+
+''' NodeType names by value, kinds of ObjMap graphs are NodeType values '''
+def _kind_names():
+    try:
+        from .objmap import NodeType
+    except ImportError: # run as a script
+        from objmap import NodeType
+    return dict((i.value, i.name) for i in NodeType)
+
+def write_jsonl(graph, fp, kind_names=None):
+    ''' one JSON object a line to the text file fp, the nodes first as
+        {"node": id, "name", "kind", "module", "size"}, then the edges as
+        {"tail": id, "head": id}. kind_names maps kinds to names, NodeType
+        names by default '''
+    if kind_names is None:
+        kind_names = _kind_names()
+    dumps = json.dumps
+    # modules and kinds repeat, so they are encoded once
+    strings = [dumps(i) for i in graph.strings()]
+    kinds = {}
+    for i in set(graph.kinds):
+        kinds[i] = dumps(kind_names.get(i, i))
+
+    line = '{"node": %d, "name": %s, "kind": %s, "module": %s, "size": %d}\n'
+    modules = graph.modules
+    sizes = graph.sizes
+    fp.writelines(line % (nid, dumps(name), kinds[k],
+                          "null" if modules[nid] < 0 else strings[modules[nid]],
+                          sizes[nid])
+                  for nid, (name, k) in enumerate(zip(graph.names, graph.kinds)))
+    fp.writelines('{"tail": %d, "head": %d}\n' % i for i in graph.edge_ids())
+
+def write_csv(graph, fp, ids=False):
+    ''' a "tail,head" edge list to the text file fp (open it with
+        newline=''), by names or node ids if ids '''
+    writer = csv.writer(fp)
+    writer.writerow(("tail", "head"))
+    if ids:
+        writer.writerows(graph.edge_ids())
+    else:
+        names = graph.names
+        writer.writerows((names[t], names[h]) for t, h in graph.edge_ids())
+
+''' binary columns: header, then the node columns kinds (b), modules (i),
+    styles (i), sizes (q), the edge columns tails (i), heads (i), then the
+    names and the interned strings each as end offsets (q) and utf-8 data.
+    Numbers are little endian '''
+COLUMNS_MAGIC = b'OMAPCOL1'
+_header = struct.Struct('<8sqqq')
+
+def _write_array(fp, column):
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    column.tofile(fp)
+
+def _read_array(fp, typecode, count):
+    column = array(typecode)
+    if count:
+        column.fromfile(fp, count)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+def _write_strings(fp, strings):
+    ends = array('q')
+    end = 0
+    data = [i.encode('utf-8') for i in strings]
+    for i in data:
+        end += len(i)
+        ends.append(end)
+    _write_array(fp, ends)
+    fp.write(b''.join(data))
+
+def _read_strings(fp, count):
+    ends = _read_array(fp, 'q', count)
+    data = fp.read(ends[-1] if count else 0)
+    start = 0
+    strings = []
+    for end in ends:
+        strings.append(data[start:end].decode('utf-8'))
+        start = end
+    return strings
+
+def write_columns(graph, fp):
+    ''' the graph as columns to the binary file fp, read_columns() or any
+        reader knowing the layout gets it back without parsing '''
+    fp.write(_header.pack(COLUMNS_MAGIC, len(graph.names), graph.edge_count(),
+                          len(graph.strings())))
+    for i in (graph.kinds, graph.modules, graph.styles, graph.sizes,
+              graph.tails, graph.heads):
+        _write_array(fp, i)
+    _write_strings(fp, graph.names)
+    _write_strings(fp, graph.strings())
+
+def read_columns(fp):
+    magic, nodes, edges, strings = _header.unpack(fp.read(_header.size))
+    if magic != COLUMNS_MAGIC:
+        raise ValueError("not a columns export")
+
+    kinds = _read_array(fp, 'b', nodes)
+    modules = _read_array(fp, 'i', nodes)
+    styles = _read_array(fp, 'i', nodes)
+    sizes = _read_array(fp, 'q', nodes)
+    tails = _read_array(fp, 'i', edges)
+    heads = _read_array(fp, 'i', edges)
+    names = _read_strings(fp, nodes)
+    return Graph.from_columns(names, kinds, modules, styles, sizes, tails,
+                              heads, _read_strings(fp, strings))
+
+''' format -> (writer, file mode) '''
+writers = {"jsonl" : (write_jsonl, 'w'),
+           "csv" : (write_csv, 'w'),
+           "columns" : (write_columns, 'wb')}
+
+def export(graph, filename, format="jsonl"):
+    if not writers.__contains__(format):
+        print("Err:", format, "is not an export format.")
+        return None
+
+    writer, mode = writers[format]
+    if mode == 'w':
+        with open(filename, mode, encoding='utf-8', newline='') as fp:
+            writer(graph, fp)
+    else:
+        with open(filename, mode) as fp:
+            writer(graph, fp)
+    return filename
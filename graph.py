@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact graphs: interned node ids, array edges and per-node columns.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+from array import array
+
+class Graph():
+    ''' a directed graph with node names interned to ints. Edges are two
+        array('i') columns of tail and head ids in insertion order, added
+        once each, and every node has compact kind, module, style and size
+        columns. Modules and styles are interned strings, -1 means none.
+        Edges as [tail, head] name lists, like ClsMap returns them, are
+        made only on demand by edges() '''
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.kinds = array('b')
+        self.modules = array('i')
+        self.styles = array('i')
+        self.sizes = array('q')
+        self.tails = array('i')
+        self.heads = array('i')
+        self.__strings = []  # module and style names
+        self.__string_ids = {}
+        self.__edge_set = set()
+        self.__adjacency = None
+
+    @classmethod
+    def from_edges(cls, edges):
+        graph = cls()
+        for i in edges:
+            graph.add_edge(i[0], i[1])
+        return graph
+
+    @classmethod
+    def from_columns(cls, names, kinds, modules, styles, sizes, tails, heads,
+                     strings):
+        ''' a graph of columns like a read back export, the edge dedup
+            index is built by the first add '''
+        graph = cls()
+        graph.names = list(names)
+        graph.ids = dict(zip(graph.names, range(len(graph.names))))
+        graph.kinds = kinds
+        graph.modules = modules
+        graph.styles = styles
+        graph.sizes = sizes
+        graph.tails = tails
+        graph.heads = heads
+        graph.__strings = list(strings)
+        graph.__string_ids = dict(zip(graph.__strings,
+                                      range(len(graph.__strings))))
+        graph.__edge_set = None
+        return graph
+
+    def strings(self):
+        ''' the interned module and style names, indexed by column values '''
+        return self.__strings
+
+    def __len__(self):
+        return len(self.names)
+
+    def edge_count(self):
+        return len(self.tails)
+
+    def __intern(self, string):
+        if string is None:
+            return -1
+        sid = self.__string_ids.get(string)
+        if sid is None:
+            sid = self.__string_ids[string] = len(self.__strings)
+            self.__strings.append(string)
+        return sid
+
+    def __string(self, sid):
+        return None if sid < 0 else self.__strings[sid]
+
+    def add_node(self, name, kind=0, module=None, style=None, size=0):
+        ''' id of node name, added if new. Columns of a node already in
+            the graph are only set when given '''
+        nid = self.ids.get(name)
+        if nid is None:
+            nid = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.kinds.append(kind)
+            self.modules.append(self.__intern(module))
+            self.styles.append(self.__intern(style))
+            self.sizes.append(size)
+            return nid
+
+        if kind:
+            self.kinds[nid] = kind
+        if module is not None:
+            self.modules[nid] = self.__intern(module)
+        if style is not None:
+            self.styles[nid] = self.__intern(style)
+        if size:
+            self.sizes[nid] = size
+        return nid
+
+    def __edge_index(self):
+        if self.__edge_set is None: # compacted, rebuild it
+            self.__edge_set = set(t << 32 | h for t, h in
+                                  zip(self.tails, self.heads))
+        return self.__edge_set
+
+    def add_edge_ids(self, tail, head):
+        ''' add edge tail -> head of node ids, False if it's in already '''
+        index = self.__edge_index()
+        key = tail << 32 | head
+        if key in index:
+            return False
+        index.add(key)
+        self.tails.append(tail)
+        self.heads.append(head)
+        self.__adjacency = None
+        return True
+
+    def add_edge(self, tail, head):
+        return self.add_edge_ids(self.add_node(tail), self.add_node(head))
+
+    def has_edge(self, tail, head):
+        t = self.ids.get(tail)
+        h = self.ids.get(head)
+        if t is None or h is None:
+            return False
+        return (t << 32 | h) in self.__edge_index()
+
+    def compact(self):
+        ''' free the edge dedup index, it's rebuilt by the next add '''
+        self.__edge_set = None
+        self.__adjacency = None
+
+    def edge_ids(self):
+        return zip(self.tails, self.heads)
+
+    def edges(self):
+        ''' [tail, head] names of all edges, in insertion order '''
+        names = self.names
+        return [[names[t], names[h]] for t, h in zip(self.tails, self.heads)]
+
+    def module(self, name):
+        return self.__string(self.modules[self.ids[name]])
+
+    def style(self, name):
+        return self.__string(self.styles[self.ids[name]])
+
+    def kind(self, name):
+        return self.kinds[self.ids[name]]
+
+    def size(self, name):
+        return self.sizes[self.ids[name]]
+
+    def module_count(self):
+        ''' number of different modules of the nodes, none counts as one '''
+        return len(set(self.modules))
+
+    def adjacency(self):
+        ''' (offsets, heads) arrays: the successors of node n are
+            heads[offsets[n]:offsets[n + 1]], kept until edges change '''
+        if self.__adjacency is not None:
+            return self.__adjacency
+
+        offsets = array('i', bytes(4 * (len(self.names) + 1)))
+        for t in self.tails:
+            offsets[t + 1] += 1
+        for n in range(len(self.names)):
+            offsets[n + 1] += offsets[n]
+        heads = array('i', bytes(4 * len(self.tails)))
+        fill = offsets[:-1]
+        for t, h in zip(self.tails, self.heads):
+            heads[fill[t]] = h
+            fill[t] += 1
+
+        self.__adjacency = (offsets, heads)
+        return self.__adjacency
+
+    def successors(self, name):
+        offsets, heads = self.adjacency()
+        nid = self.ids[name]
+        return [self.names[i] for i in heads[offsets[nid]:offsets[nid + 1]]]
+
+    def relabel(self, func):
+        ''' a new graph with every name replaced by func(name), nodes
+            getting the same name are merged and so are their edges '''
+        graph = Graph()
+        newids = array('i')
+        for nid, name in enumerate(self.names):
+            newids.append(graph.add_node(func(name), self.kinds[nid],
+                                         self.__string(self.modules[nid]),
+                                         self.__string(self.styles[nid]),
+                                         self.sizes[nid]))
+        for t, h in zip(self.tails, self.heads):
+            graph.add_edge_ids(newids[t], newids[h])
+        return graph
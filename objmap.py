@@ -26,9 +26,35 @@ Released under the MIT licence.
 # DEALINGS IN THE SOFTWARE.
 
 from enum import Enum
-from graphviz import Digraph
 
+try:
+    from .clsmap import CPicker
+    from .graph import Graph
+    from .render import Digraph, render
+    from .sizes import SizeIndex, size_str
+    from .stats import count, counted, phase, timed
+except ImportError: # run as a script
+    from clsmap import CPicker
+    from graph import Graph
+    from render import Digraph, render
+    from sizes import SizeIndex, size_str
+    from stats import count, counted, phase, timed
+
+from html import escape
+
+import collections
+import copy
 import inspect
+import itertools
+import linecache
+import math
+import queue
+import reprlib
+import sys
+import threading
+import time
+import types
+import weakref
 
 ''' 
 Every node has a unique type in a map graph and every type defined a   
@@ -100,13 +126,317 @@ type_isdict = { NodeType.cls      : inspect.isclass,
                 NodeType.other: isother,
               }
 
+''' 
+NodeTypes decided by the type of a member value only, cached per type so
+every member is classified with one dictionary lookup. Abstract classes
+depend on the value and are checked apart.
+'''
+_type_kinds = weakref.WeakKeyDictionary()
+
+def _kinds_by_type(obj):
+    kinds = []
+    for i in type_isdict:
+        if i == NodeType.other or i == NodeType.abstract:
+            continue
+        if type_isdict[i](obj):
+            kinds.append(i)
+
+    if not len(kinds) and not inspect.isbuiltin(obj) \
+       and not inspect.ismodule(obj):
+        kinds.append(NodeType.other)
+
+    return tuple(kinds)
+
+_class_slot = object.__dict__['__class__']
+
+def _has_class_hook(typ):
+    ''' instances of typ answer __class__ by code of their own '''
+    hooks = {}
+    for i in reversed(typ.__mro__):
+        for j in ('__class__', '__getattribute__'):
+            if i.__dict__.__contains__(j):
+                hooks[j] = i.__dict__[j]
+    if hooks.get('__class__', _class_slot) is not _class_slot:
+        return True
+    return not isinstance(hooks.get('__getattribute__'),
+                          types.WrapperDescriptorType)
+
+def member_kinds(obj, static=False):
+    '''Return a tuple of all NodeTypes obj belongs to,
+       static: only type(obj) is asked, no __class__ hook of obj runs'''
+    typ = type(obj)
+    try:
+        kinds = _type_kinds.get(typ)
+    except TypeError: # type can't be weak referenced
+        kinds = None
+
+    if kinds is None and static and _has_class_hook(typ):
+        # isinstance() would ask the hook, don't look further
+        return (NodeType.other,)
+
+    if kinds is None:
+        kinds = _kinds_by_type(obj)
+        # a faked __class__ changes isinstance(), don't cache it
+        if static or getattr(obj, '__class__', typ) is typ:
+            try:
+                _type_kinds[typ] = kinds
+            except TypeError:
+                pass
+
+    if NodeType.cls in kinds and inspect.isabstract(obj):
+        kinds += (NodeType.abstract,)
+
+    return kinds
+
+class MemberError():
+    ''' stands for a member that failed or timed out being read, so the
+        member is still listed, in the others table '''
+    def __init__(self, name, reason):
+        self.name = name
+        self.reason = reason
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.name, self.reason)
+
+class AttrReader():
+    ''' getattr() in a daemon thread, a read longer than timeout seconds
+        is left behind and the next reads go to a new thread '''
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.__requests = None
+
+    @staticmethod
+    def __run(requests):
+        while True:
+            job = requests.get()
+            if job is None:
+                return
+            obj, name, box, done = job
+            try:
+                box.append((True, getattr(obj, name)))
+            except BaseException as e:
+                box.append((False, e))
+            done.set()
+
+    def read(self, obj, name):
+        if self.__requests is None:
+            self.__requests = queue.SimpleQueue()
+            threading.Thread(target=self.__run, args=(self.__requests,),
+                             daemon=True).start()
+
+        box = []
+        done = threading.Event()
+        self.__requests.put((obj, name, box, done))
+        if not done.wait(self.timeout):
+            self.__requests = None # the thread is stuck, forget it
+            raise TimeoutError("read for over %gs" % self.timeout)
+        ok, value = box[0]
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        if self.__requests is not None:
+            self.__requests.put(None)
+            self.__requests = None
+
+''' inspect.isclass and ismodule by type(obj) only, isinstance() would
+    fall back to obj.__class__, which can be a property or a lazy proxy '''
+def isclass_static(obj):
+    return issubclass(type(obj), type)
+
+def ismodule_static(obj):
+    return issubclass(type(obj), types.ModuleType)
+
+def static_names(obj):
+    ''' member names of obj like dir(), read from __dict__ of obj and of
+        the classes of its MRO, no attribute hook runs '''
+    names = set()
+    if ismodule_static(obj):
+        classes = ()
+    elif isclass_static(obj):
+        classes = type.__dict__['__mro__'].__get__(obj)
+    else:
+        classes = type(obj).__mro__
+    try:
+        names.update(object.__getattribute__(obj, '__dict__'))
+    except (AttributeError, TypeError):
+        pass
+    for i in classes:
+        names.update(type.__dict__['__dict__'].__get__(i))
+    return sorted(i for i in names if isinstance(i, str))
+
+''' builtin descriptors whose __get__ only binds or reads memory '''
+_pure_descriptors = (types.FunctionType, classmethod, staticmethod,
+                     types.MemberDescriptorType)
+
+def static_getattr(obj, name):
+    ''' getattr without running code: descriptors are returned as they
+        are, except functions, class and static methods, which are bound,
+        and slots, which are read '''
+    value = inspect.getattr_static(obj, name)
+    if type(value) not in _pure_descriptors:
+        return value
+
+    if isclass_static(obj):
+        if type(value) in (classmethod, staticmethod):
+            return value.__get__(None, obj)
+        return value
+    if ismodule_static(obj):
+        return value
+    try:
+        if name in object.__getattribute__(obj, '__dict__'):
+            return value # instance attributes are never bound
+    except (AttributeError, TypeError):
+        pass
+    return value.__get__(obj, type(obj))
+
+class Members():
+    ''' all members of obj, got by one inspect.getmembers call and
+        bucketed by NodeType.
+        static: read members by static_getattr, no property, lazy loader
+                or __getattr__ hook of obj runs, they're descriptors
+        attr_timeout: seconds each getattr may take, read by AttrReader.
+        A member failing to read is a MemberError, kept in errors too '''
+    def __init__(self, obj, isin_module, static=False, attr_timeout=None):
+        self.values = {}
+        self.inmodule = set()
+        self.buckets = {}
+        self.errors = {}
+        self.static = static
+        self.__instances = None
+
+        if static:
+            members = self.__read(obj, static_names(obj), static_getattr)
+        elif attr_timeout is not None:
+            reader = AttrReader(attr_timeout)
+            try:
+                names = sorted(dir(obj))
+            except Exception:
+                names = static_names(obj)
+            members = self.__read(obj, names, reader.read)
+            reader.close()
+        else:
+            members = inspect.getmembers(obj)
+        count("getmembers")
+        count("getattr", len(members))
+
+        for name,value in members:
+            self.values[name] = value
+            if isin_module(value):
+                self.inmodule.add(name)
+            for i in member_kinds(value, static):
+                if not self.buckets.__contains__(i):
+                    self.buckets[i] = []
+                self.buckets[i].append(name)
+
+    def __read(self, obj, names, read):
+        members = []
+        for name in names:
+            try:
+                members.append((name, read(obj, name)))
+            except AttributeError: # listed but not there, like getmembers
+                continue
+            except Exception as e:
+                self.errors[name] = "%s: %s" % (type(e).__name__, e)
+                members.append((name, MemberError(name, self.errors[name])))
+        return members
+
+    def names(self, nodetype, inmodule=True):
+        ''' member names of nodetype, in the root module only if inmodule '''
+        names = self.buckets.get(nodetype, [])
+        if not inmodule:
+            return list(names)
+        return [i for i in names if i in self.inmodule]
+
+    def __isinstance(self, value, cls):
+        try:
+            if self.static: # ABCs would read value.__class__
+                return issubclass(type(value), cls)
+            return isinstance(value, cls)
+        except TypeError: # like typing.Any refuses to check instances
+            return False
+
+    def instances(self):
+        ''' map every instance name to names of the classes it belongs to,
+            classes are indexed once, so each member only walks its MRO '''
+        if self.__instances is not None:
+            return self.__instances
+
+        classes = self.names(NodeType.cls)
+        order = {}
+        index = {}    # id(cls) -> names of cls
+        special = []  # classes decide isinstance() themselves, like ABCs
+        instancecheck = type.__dict__['__instancecheck__']
+        for i in classes:
+            cls = self.values[i]
+            order[i] = len(order)
+            if getattr(type(cls), '__instancecheck__', instancecheck) \
+               is not instancecheck:
+                special.append(i)
+            elif not index.__contains__(id(cls)):
+                index[id(cls)] = [i]
+            else:
+                index[id(cls)].append(i)
+
+        self.__instances = {}
+        for name,value in self.values.items():
+            if name.startswith('__'):
+                continue
+
+            found = []
+            mros = [type(value).__mro__]
+            if self.static:
+                klass = type(value)
+            else:
+                klass = getattr(value, '__class__', type(value))
+            if klass is not type(value) and isinstance(klass, type):
+                mros.append(klass.__mro__)
+            for mro in mros:
+                for i in mro:
+                    for j in index.get(id(i), ()):
+                        if j not in found:
+                            found.append(j)
+            for i in special:
+                if self.__isinstance(value, self.values[i]):
+                    found.append(i)
+
+            if len(found):
+                found.sort(key=order.__getitem__)
+                self.__instances[name] = found
+
+        return self.__instances
+
 class ObjMap():
-    def __init__(self, obj):
+    ''' sizes: annotate rows with shallow / retained sizes and color them
+        sort_by: "name" or "size", the order of rows in tables
+        summary: options of summary_default for all tables, or a dict of
+                 such options keyed by NodeType
+        static, attr_timeout: how members are read, see Members '''
+    def __init__(self, obj, sizes=False, sort_by="name", summary=None,
+                 static=False, attr_timeout=None):
         self.root_node = obj
+        self.with_sizes = sizes
+        self.sort_by = sort_by
+        self.sizes = None
+        self.summary = summary
+        self.static = static
+        self.attr_timeout = attr_timeout
+        self.row_nodes = {}
+        # styles are updated while drawing, every map owns a copy
+        self.hnode_styles = copy.deepcopy(ObjMap.hnode_styles)
+        # properties of a static map stay descriptors, they need a table
+        if static:
+            self.hnode_styles[NodeType.descriptor] = \
+                copy.deepcopy(ObjMap.descriptor_style)
         
+        # hooks of an instance never run in static mode, names come from its type
+        static_instance = static and not isclass_static(obj) \
+                          and not ismodule_static(obj)
+
         ''' get root node module name obj belongs to '''
         try:
-            module = inspect.getmodule(obj)
+            module = inspect.getmodule(type(obj) if static_instance else obj)
             self.root_module = module.__name__
         except:
             self.root_module = ""
@@ -114,10 +444,12 @@ class ObjMap():
     
         ''' get root node name itself '''
         try:
+            if static_instance:
+                raise AttributeError('__name__')
             self.root_node_name = obj.__name__
         except:
             ''' style like <sample.A object at 0xb70f418c> '''
-            name = str(obj)
+            name = object.__repr__(obj) if static_instance else str(obj)
             if name.startswith('<'):
                 name = name.split()[0]
                 name = name[1:] + ".instance"
@@ -130,6 +462,7 @@ class ObjMap():
             typestr = "class"  # class is more usual
 
         self.root_type = typestr
+        self.__members = {}
 
     def isin_root_module(self, clsinfo):
         ''' clsinfo is in the same module as this class '''
@@ -139,34 +472,44 @@ class ObjMap():
             return True
 
         try:
-            if clsinfo.__module__ != self.root_module:
+            if self.static:
+                module = inspect.getattr_static(clsinfo, '__module__', None)
+            else:
+                module = clsinfo.__module__
+            if module != self.root_module:
                 return False
         except:
             pass
         
         return True
 
-    def __objs_predicate(self, obj, predicate):
-        ''' generate all nodes with predicate '''
-        objs = []
-        for name,type in inspect.getmembers(obj, predicate):
-            if(self.isin_root_module(getattr(obj, name))):
-                objs.append(getattr(obj, name))
+    def members(self, obj):
+        ''' members of obj, enumerated only once for every map '''
+        key = id(obj)
+        if not self.__members.__contains__(key):
+            # keep obj referenced so its id can't be reused
+            with phase("members"):
+                self.__members[key] = (obj, Members(obj, self.isin_root_module,
+                                                    self.static,
+                                                    self.attr_timeout))
+        return self.__members[key][1]
 
-        return objs
-    
-    def __obj_nodes_predicate(self, obj, predicate):
-        ''' generate all nodes with predicate '''
-        nodes = []
-        for name,type in inspect.getmembers(obj, predicate):
-            if(self.isin_root_module(getattr(obj, name))):
-                nodes.append(name)
+    def members_clear(self):
+        ''' forget all enumerated members, objects may have changed '''
+        self.__members = {}
 
-        return nodes
+    def __objs_kind(self, obj, nodetype):
+        ''' generate all member objects with nodetype '''
+        members = self.members(obj)
+        return [members.values[i] for i in members.names(nodetype)]
+    
+    def __obj_nodes_kind(self, obj, nodetype):
+        ''' generate all nodes with nodetype '''
+        return self.members(obj).names(nodetype)
 
-    def __obj_edges_predicate(self, obj, predicate):
-        ''' generate all edges from obj to nodes with predicate '''
-        nodes = self.__obj_nodes_predicate(obj, predicate)
+    def __obj_edges_kind(self, obj, nodetype):
+        ''' generate all edges from obj to nodes with nodetype '''
+        nodes = self.__obj_nodes_kind(obj, nodetype)
         if len(nodes) == 0:
             return []
 
@@ -179,41 +522,41 @@ class ObjMap():
     def root_nodes(self, obj):
         ''' create root node, a node is as ['namestr'] '''
         name = self.root_node_name
-        if len(self.root_module) and not inspect.ismodule(obj):
+        ismodule = ismodule_static if self.static else inspect.ismodule
+        if len(self.root_module) and not ismodule(obj):
             name = self.root_module + '.' + self.root_node_name
 
         return [name]
 
     def class_nodes(self, obj):
-        nodes = self.__obj_nodes_predicate(obj, type_isdict[NodeType.cls])
-        return nodes
+        return self.__obj_nodes_kind(obj, NodeType.cls)
     
     def func_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.func])
+        return self.__obj_nodes_kind(obj, NodeType.func)
     
     def tuple_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.tuple])
+        return self.__obj_nodes_kind(obj, NodeType.tuple)
 
     def list_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.list])
+        return self.__obj_nodes_kind(obj, NodeType.list)
 
     def dict_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.dict])
+        return self.__obj_nodes_kind(obj, NodeType.dict)
 
     def str_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.str])
+        return self.__obj_nodes_kind(obj, NodeType.str)
     
     def number_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.number])
+        return self.__obj_nodes_kind(obj, NodeType.number)
     
     def abstract_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.abstract])
+        return self.__obj_nodes_kind(obj, NodeType.abstract)
     
     def generator_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.generator])
+        return self.__obj_nodes_kind(obj, NodeType.generator)
     
     def traceback_nodes(self, obj):
-        return self.__obj_nodes_predicate(obj, type_isdict[NodeType.traceback])
+        return self.__obj_nodes_kind(obj, NodeType.traceback)
     
     @staticmethod
     def isprivate_name(name):
@@ -221,62 +564,40 @@ class ObjMap():
 
     def descriptor_nodes(self, obj):
         nodes = []
-        for name,type in inspect.getmembers(obj, type_isdict[NodeType.descriptor]):
+        for name in self.members(obj).names(NodeType.descriptor, False):
             if not self.isprivate_name(name):
                 nodes.append(name)
     
         return nodes 
 
-    @staticmethod
-    def __iscls_instance(obj, classes, name):        
-        var = getattr(obj, name)
-        for i in classes:
-            if isinstance(var, i):
-                return True
-        return False
-
     def obj_classes(self, obj):
-        return self.__objs_predicate(obj, type_isdict[NodeType.cls])
+        return self.__objs_kind(obj, NodeType.cls)
     
     def obj_nodes(self, obj):
-        nodes = []
-        
-        for name,typ in inspect.getmembers(obj):
-            if self.isprivate_name(name):
-                continue
-
-            if self.__iscls_instance(obj, self.obj_classes(obj), name):
-               nodes.append(name)
-
-        return nodes
+        return list(self.members(obj).instances())
     
     def other_nodes(self, obj):
         nodes = []
+        instances = self.members(obj).instances()
 
-        for name,typ in inspect.getmembers(obj, type_isdict[NodeType.other]):
+        for name in self.members(obj).names(NodeType.other, False):
             if name.startswith('__'):
                 continue
             ''' exclude objs '''
-            if not self.__iscls_instance(obj, self.obj_classes(obj), name):
+            if not instances.__contains__(name):
                nodes.append(name)
     
         return nodes
 
     # trim all methods if name same as the cls
     def objmethod_nodes(self, obj):
-        nodes = []
-        for name,type in inspect.getmembers(obj, type_isdict[NodeType.method]):
-            nodes.append(name)
-    
-        return nodes
+        return self.members(obj).names(NodeType.method, False)
     
     def objmethod_filter_nodes(self, obj):
-        clsnodes = []
+        cls = type(obj) if self.static else obj.__class__
+        clsnodes = set(self.members(cls).names(NodeType.func, False))
         nodes = []
-        for name,type in inspect.getmembers(obj.__class__, type_isdict[NodeType.func]):
-            clsnodes.append(name)
-        
-        for name,type in inspect.getmembers(obj, type_isdict[NodeType.method]):
+        for name in self.members(obj).names(NodeType.method, False):
             if name not in clsnodes:
                 nodes.append(name)
     
@@ -289,6 +610,8 @@ class ObjMap():
                             "get_nodes" : func_nodes}
     incls_method_style = method_style.copy()
     incls_method_style['get_nodes'] = objmethod_filter_nodes
+    descriptor_style = {"title" : "descriptors", "align" : "left",
+                        "color" : "YellowGreen", "get_nodes" : descriptor_nodes}
     
     hnode_styles = {
         # * means this style will be updated dynamically
@@ -299,9 +622,7 @@ class ObjMap():
                              NodeType.clsfunc:  {"title" : "functions", "align" : "left",  
                                                  "color" : "#bebada",
                                                  "get_nodes" : func_nodes},
-                             NodeType.descriptor:{"title" : "descriptors", "align" : "left",  
-                                                 "color" : "YellowGreen",
-                                                 "get_nodes" : descriptor_nodes},
+                             NodeType.descriptor: descriptor_style,
                            },
         NodeType.obj:      {"title" : "instances", "align" : "left", "color" : "SandyBrown",
                             "get_nodes" : obj_nodes,
@@ -344,19 +665,167 @@ class ObjMap():
             return title[title.find('.') + 1:]
         return title
     
+    # ports name the rows, the node names themselves by default
     @classmethod
-    def label_htab_create(cls, nodes, title, align="center", color="SandyBrown"):
+    @timed("labels")
+    def label_htab_create(cls, nodes, title, align="center", color="SandyBrown",
+                          ports=None, colors=None):
         tab_header = '''<<table border="0" cellborder="1" cellspacing="0">\n'''
         tab_tail = "</table>>\n"
         
         title = cls.root_type_title_remove_prefix(title)
         th = '\t<tr><td bgcolor="%s" style="rounded"><b><i>%s</i></b></td></tr>\n'\
-             % (color, title)
+             % (color, escape(title, False))
     
-        trs = ""
-        for i in nodes:
-            trs += '''\t<tr><td port="%s" align="%s">%s</td></tr>\n''' % (i, align,i)
-        return tab_header + th + trs + tab_tail
+        trs = [tab_header, th]
+        for n, i in enumerate(nodes):
+            port = i if ports is None else ports[n]
+            port = escape(port, False).replace('"', '&quot;')
+            i = escape(i, False)
+            if colors is None:
+                trs.append('''\t<tr><td port="%s" align="%s">%s</td></tr>\n''' % (port, align,i))
+            else:
+                trs.append('''\t<tr><td port="%s" align="%s" bgcolor="%s">%s</td></tr>\n'''
+                           % (port, align, colors[n], i))
+        trs.append(tab_tail)
+        return ''.join(trs)
+
+    def sizes_prepare(self, obj):
+        ''' size all members of obj in one shared traversal, in name order '''
+        self.sizes = SizeIndex(exclude=[obj])
+        values = self.members(obj).values
+        self.sizes_total = self.sizes.shallow(obj)
+        self.sizes_max = 1
+        for name in values:
+            if self.isprivate_name(name):
+                continue
+            size = self.sizes.retained(values[name])
+            self.sizes_total += size
+            self.sizes_max = max(self.sizes_max, size)
+
+    def size_color(self, size):
+        ''' light to dark as size grows to the biggest member, log scaled '''
+        index = int(6 * math.log1p(size) / math.log1p(self.sizes_max))
+        return CPicker.ylorbr9[max(0, min(6, index))]
+
+    def size_rows(self, obj, nodes, nodetype):
+        ''' nodes in sort_by order, their texts with sizes and colors '''
+        if nodetype == NodeType.root:
+            sizes = [(self.sizes.shallow(obj), self.sizes_total)]
+        else:
+            values = self.members(obj).values
+            sizes = [(self.sizes.shallow(values[i]),
+                      self.sizes.retained(values[i])) for i in nodes]
+
+        rows = list(zip(nodes, sizes))
+        if self.sort_by == "size":
+            rows.sort(key=lambda i: i[1][1], reverse=True)
+
+        nodes = [i[0] for i in rows]
+        texts = ["%s  %s / %s" % (i[0], size_str(i[1][0]), size_str(i[1][1]))
+                 for i in rows]
+        colors = [self.size_color(i[1][1]) for i in rows]
+        return nodes, texts, colors
+
+    ''' table summaries, so huge tables can't stall the layout
+        max_rows: rows at most in a table, the others go to a "… N more" row
+        order: None keeps the map order, or "name", "size", "kind"
+        group: None, or "prefix" / "module" to fold members sharing a
+               name prefix like "test_" or a __module__ into one row
+        pages: linked tables to continue on before the "… N more" row '''
+    summary_default = {"max_rows" : 200, "order" : None, "group" : None,
+                       "pages" : 0}
+
+    def summary_options(self, nodetype):
+        options = dict(self.summary_default)
+        if self.summary is None:
+            return options
+        if any(isinstance(i, NodeType) for i in self.summary):
+            options.update(self.summary.get(nodetype, {}))
+        else:
+            options.update(self.summary)
+        return options
+
+    def summary_size(self, value):
+        if self.sizes is not None:
+            return self.sizes.retained(value)
+        return sys.getsizeof(value)
+
+    @staticmethod
+    def summary_group(name, value, group, static=False):
+        ''' the group of a member, None to keep it a row of its own,
+            static: __module__ is read by inspect.getattr_static '''
+        if group == "module":
+            if static:
+                return inspect.getattr_static(value, '__module__', None)
+            return getattr(value, '__module__', None)
+        if name.startswith('__') and name.endswith('__'):
+            return None
+        parts = name.lstrip('_').split('_', 1)
+        if len(parts) < 2 or not len(parts[1]):
+            return None
+        return name[:len(name) - len(parts[1])]
+
+    def summary_pages(self, obj, nodes, texts, colors, nodetype):
+        ''' split rows into pages of (name, port, text, color), name is
+            None for rows standing for several members '''
+        rows = [(nodes[i], nodes[i], texts[i], None if colors is None else colors[i])
+                for i in range(len(nodes))]
+        if nodetype == NodeType.root: # a single row, not a member
+            return [rows]
+
+        values = self.members(obj).values
+        options = self.summary_options(nodetype)
+
+        order = options['order']
+        if order == "name":
+            rows.sort(key=lambda i: i[0])
+        elif order == "size":
+            rows.sort(key=lambda i: self.summary_size(values[i[0]]), reverse=True)
+        elif order == "kind":
+            rows.sort(key=lambda i: (type(values[i[0]]).__name__, i[0]))
+
+        if options['group'] is not None:
+            groups = {}
+            for row in rows:
+                key = self.summary_group(row[0], values[row[0]], options['group'],
+                                         self.static)
+                groups.setdefault(row[0] if key is None else key, []).append(row)
+            rows = []
+            for key, members in groups.items():
+                if len(members) == 1:
+                    rows.append(members[0])
+                    continue
+                text = "%s* (%d)" % (key, len(members))
+                color = None
+                if self.sizes is not None:
+                    size = sum(self.sizes.retained(values[i[0]]) for i in members)
+                    text = "%s  %s" % (text, size_str(size))
+                    color = self.size_color(size)
+                rows.append((None, "-g%d" % len(rows), text, color))
+
+        size = max(options['max_rows'], 1)
+        pages = [rows[i:i + size] for i in range(0, len(rows), size)]
+        if len(pages) > options['pages'] + 1:
+            hidden = [i for page in pages[options['pages'] + 1:] for i in page]
+            pages = pages[:options['pages'] + 1]
+            text = "… %d more" % len(hidden)
+            color = None
+            if self.sizes is not None:
+                size = sum(self.sizes.retained(values[i[0]]) for i in hidden
+                           if i[0] is not None)
+                text = "%s  %s" % (text, size_str(size))
+                color = self.size_color(size)
+            pages[-1] = pages[-1] + [(None, "-more", text, color)]
+
+        # linked pages end with a row leading to the next one, ports of
+        # rows that aren't members start with '-', no member name can
+        shown = 0
+        for n in range(len(pages) - 1):
+            shown += len(pages[n])
+            pages[n] = pages[n] + [(None, "-next",
+                                    "… %d more" % (len(rows) - shown), None)]
+        return pages
 
     def dot_add_htab_node(self, dot, obj, nodetype, style=None, title=None):
         if style == None:
@@ -374,23 +843,53 @@ class ObjMap():
             title = style['title']
             
         nodes = get_nodes_func(self, obj)
-        if len(nodes):
-            lab = self.label_htab_create(nodes, title, style['align'], 
-                                         style['color'])
-            dot.node(title, label=lab, shape="plaintext")
-            for i in NodeType:
-                if not style.__contains__(i):
+        if not len(nodes):
+            return False
+
+        if self.sizes is None:
+            texts, colors = nodes, None
+        else:
+            nodes, texts, colors = self.size_rows(obj, nodes, nodetype)
+        pages = self.summary_pages(obj, nodes, texts, colors, nodetype)
+
+        # dot node of every row shown, hidden rows get no edges
+        row_nodes = self.row_nodes[title] = {}
+        last = None
+        for n, page in enumerate(pages):
+            node = title if n == 0 else "%s (%d)" % (title, n + 1)
+            text = title if len(pages) == 1 else "%s (%d/%d)" % (title, n + 1,
+                                                                 len(pages))
+            lab = self.label_htab_create([i[2] for i in page], text, style['align'],
+                                         style['color'], [i[1] for i in page],
+                                         None if colors is None else
+                                         [i[3] or style['color'] for i in page])
+            dot.node(node, label=lab, shape="plaintext")
+            if last is not None:
+                dot.edge(':'.join([last, "-next"]), node)
+            last = node
+            for i in page:
+                if i[0] is not None:
+                    row_nodes[i[0]] = node
+
+        for i in NodeType:
+            if not style.__contains__(i):
+                continue
+            for node in nodes:
+                if not row_nodes.__contains__(node):
                     continue
-                for node in nodes:
-                    subtitle = node + "." + style[i]['title']
-                    if self.dot_add_htab_node(dot, getattr(obj, node), i, 
-                                              style[i], subtitle):
-                        dot.edge(':'.join([title, node]), subtitle, 
-                                 color=style[i]['color'])
-            return True
-        return False
+                subtitle = node + "." + style[i]['title']
+                if self.dot_add_htab_node(dot, self.members(obj).values[node], i, 
+                                          style[i], subtitle):
+                    dot.edge(':'.join([row_nodes[node], node]), subtitle, 
+                             color=style[i]['color'])
+        return True
 
     def dot_add_obj_nodes(self, dot, obj):
+        self.members_clear()
+        self.row_nodes = {}
+        self.sizes = None
+        if self.with_sizes:
+            self.sizes_prepare(obj)
         handled_nodes = []
         for i in self.hnode_styles:
             if self.dot_add_htab_node(dot, obj, i):
@@ -404,15 +903,15 @@ class ObjMap():
                      color=self.hnode_styles[i]['color'])
 
         def clsobj_relation_edges(self, inobj):
-            edges = []
-            objnodes = self.obj_nodes(inobj)
-            clsnodes = self.class_nodes(inobj)
-        
-            for obj in objnodes:
-                for cls in clsnodes:
-                    if isinstance(getattr(inobj, obj), getattr(inobj, cls)):
-                        edges.append([cls, obj])
-            return edges
+            graph = Graph()
+            instances = self.members(inobj).instances()
+
+            for obj in instances:
+                objid = graph.add_node(obj, NodeType.obj.value)
+                for cls in instances[obj]:
+                    graph.add_edge_ids(graph.add_node(cls, NodeType.cls.value),
+                                       objid)
+            return graph.edges()
     
         # at last add instances and cls relationship
         edges = clsobj_relation_edges(self, obj)
@@ -420,29 +919,263 @@ class ObjMap():
             return
         
         dot.attr('edge', style="dashed", color=self.hnode_styles[NodeType.obj]['color'])
-        objtitle = self.hnode_styles[NodeType.obj]['title']
-        clstitle = self.hnode_styles[NodeType.cls]['title']
+        objrows = self.row_nodes.get(self.hnode_styles[NodeType.obj]['title'], {})
+        clsrows = self.row_nodes.get(self.hnode_styles[NodeType.cls]['title'], {})
         for i in edges:
-            dot.edge(':'.join([clstitle, i[0]]), ':'.join([objtitle, i[1]]))
+            if clsrows.__contains__(i[0]) and objrows.__contains__(i[1]):
+                dot.edge(':'.join([clsrows[i[0]], i[0]]),
+                         ':'.join([objrows[i[1]], i[1]]))
     
+    def objmap_graph(self):
+        ''' the data of the map as a graph.Graph, no graphviz involved:
+            the root and a node per table row, kind is the NodeType value
+            of its table, with module and size (retained if sizes, else
+            shallow). Edges go from the root to rows and from classes to
+            their instances '''
+        obj = self.root_node
+        self.members_clear()
+        self.sizes = None
+        if self.with_sizes:
+            self.sizes_prepare(obj)
+        values = self.members(obj).values
+
+        graph = Graph()
+        size = sys.getsizeof(obj) if self.sizes is None else self.sizes_total
+        root = graph.add_node(self.root_nodes(obj)[0], NodeType.root.value,
+                              self.root_module or None, size=size)
+        for nodetype, style in self.hnode_styles.items():
+            if nodetype == NodeType.root:
+                continue
+            for name in style['get_nodes'](self, obj):
+                if graph.ids.__contains__(name): # first table wins
+                    continue
+                value = values[name]
+                if self.static:
+                    module = inspect.getattr_static(value, '__module__', None)
+                else:
+                    module = getattr(value, '__module__', None)
+                nid = graph.add_node(name, nodetype.value,
+                                     module if isinstance(module, str) else None,
+                                     size=self.summary_size(value))
+                graph.add_edge_ids(root, nid)
+
+        instances = self.members(obj).instances()
+        for name in instances:
+            for cls in instances[name]:
+                graph.add_edge(cls, name)
+        return graph
+
     # Rank directions: "TB", "LR", "BT", "RL"
     # splines: "spline", "ortho", "polyline", "curved", "line"
     # reference to' https://graphviz.gitlab.io/_pages/doc/info/attrs.html#d:splines'
     # 'polyline' is better when there're many lines between nodes
-    def objmap_create(self, filename="obj.gv", format="png", rankdir="TB", splines="spline"):
-        dot = Digraph('structs', node_attr={'shape': 'record'})
+    def objmap_dot(self, rankdir="TB", splines="spline", dot=None):
+        ''' build the graphviz graph of the map without rendering it,
+            or add it to dot like a DotWriter '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'record'})
 
         dot.attr(rankdir=rankdir)
         dot.attr(splines=splines)
         dot.attr(compound='true')
         #dot.attr(concentrate='true')
 
-        self.dot_add_obj_nodes(dot, self.root_node)
-        dot.render(filename, format=format, view=False)
-        dot.save()
+        with phase("build"):
+            self.dot_add_obj_nodes(counted(dot), self.root_node)
+        return dot
+
+    # filename None returns the image data instead of writing files
+    def objmap_create(self, filename="obj.gv", format="png", rankdir="TB",
+                      splines="spline", save_source=True):
+        dot = self.objmap_dot(rankdir, splines)
+        return render(dot, filename, format, save_source)
+
+    ''' deep map: follow containers, instances and class attributes '''
+    deep_leaf_types = (str, bytes, int, float, complex, bool, type(None))
+    __deep_repr = reprlib.Repr()
+    __deep_repr.maxstring = 40
+    __deep_repr.maxother = 40
+
+    @classmethod
+    def deep_short_repr(cls, obj):
+        try:
+            return cls.__deep_repr.repr(obj)
+        except Exception:
+            return "<%s>" % type(obj).__name__
+
+    def deep_children(self, obj, limit=None):
+        ''' (name, value) pairs a deep map follows from obj, at most limit
+            of them, and the number of all pairs. Containers are never
+            walked past limit, so their size doesn't matter '''
+        try:
+            if isinstance(obj, dict):
+                return [(self.deep_short_repr(k), v) for k, v in
+                        itertools.islice(obj.items(), limit)], len(obj)
+            if isinstance(obj, (list, tuple)):
+                return [("[%d]" % i, v) for i, v in
+                        itertools.islice(enumerate(obj), limit)], len(obj)
+            if isinstance(obj, (set, frozenset)):
+                return [("{%d}" % i, v) for i, v in
+                        itertools.islice(enumerate(obj), limit)], len(obj)
+        except RuntimeError: # changed size while walked
+            return [], 0
+
+        try:
+            attrs = vars(obj)
+        except TypeError: # no __dict__
+            return [], 0
+        children = []
+        for name, value in list(attrs.items()):
+            if self.isprivate_name(name):
+                continue
+            if (inspect.isclass(obj) or inspect.ismodule(obj)) \
+               and inspect.isclass(value) and not self.isin_root_module(value):
+                continue
+            children.append((name, value))
+        return children[:limit], len(children)
+
+    def deep_followed(self, obj):
+        ''' a deep map draws obj as a node instead of a row '''
+        if isinstance(obj, self.deep_leaf_types):
+            return False
+        if inspect.ismodule(obj) or inspect.isroutine(obj) \
+           or isdescriptor(obj) and not inspect.isclass(obj):
+            return False
+        return isinstance(obj, (dict, list, tuple, set, frozenset)) \
+               or inspect.isclass(obj) or hasattr(obj, '__dict__')
+
+    def deep_color(self, obj):
+        for i in member_kinds(obj):
+            if self.hnode_styles.__contains__(i):
+                return self.hnode_styles[i]['color']
+        return self.hnode_styles[NodeType.obj]['color']
+
+    def deep_dot(self, depth=3, max_nodes=500, max_edges=2000, max_time=5.0,
+                 max_rows=50, rankdir="LR", dot=None):
+        ''' build a map following objects breadth first up to depth levels.
+            Every object is drawn once whatever the cycles, and when
+            max_nodes, max_edges or max_time (seconds) is hit the walk stops
+            and a truncation node tells why. self.deep_truncated keeps the
+            reason, None if the map is complete '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'plaintext'})
+        dot.attr(rankdir=rankdir)
+
+        deadline = time.monotonic() + max_time
+        root = self.root_node
+        names = {id(root): self.root_node_name}
+        keep = [root]  # keep objects alive, so ids stay unique
+        pending = collections.deque([(root, 0)])
+        edges = 0
+        self.deep_truncated = None
+
+        while len(pending):
+            obj, level = pending.popleft()
+            node = "o%d" % id(obj)
+            if self.deep_truncated is None and time.monotonic() > deadline:
+                self.deep_truncated = "max_time %gs" % max_time
+
+            title = "%s: %s" % (names[id(obj)], type(obj).__name__)
+            if self.deep_truncated is not None: # queued but not expanded
+                dot.node(node, label=self.label_htab_create([], title, "left",
+                         self.deep_color(obj)))
+                continue
+
+            rows = []
+            links = []
+            children, total = self.deep_children(obj, max_rows)
+            shown = len(children)
+            for n, (name, value) in enumerate(children):
+                if time.monotonic() > deadline:
+                    self.deep_truncated = "max_time %gs" % max_time
+                    shown = n # the rest is counted as more
+                    break
+                if not self.deep_followed(value):
+                    rows.append("%s = %s" % (name, self.deep_short_repr(value)))
+                    continue
+
+                port = "p%d" % len(rows)
+                # no edge, no node: children beyond budgets are only rows
+                if edges >= max_edges:
+                    self.deep_truncated = "max_edges %d" % max_edges
+                    rows.append("%s: %s …" % (name, type(value).__name__))
+                    continue
+                if not names.__contains__(id(value)):
+                    if level + 1 > depth:
+                        rows.append("%s: %s …" % (name, type(value).__name__))
+                        continue
+                    if len(names) >= max_nodes:
+                        self.deep_truncated = "max_nodes %d" % max_nodes
+                        rows.append("%s: %s …" % (name, type(value).__name__))
+                        continue
+                    names[id(value)] = name
+                    keep.append(value)
+                    pending.append((value, level + 1))
+
+                rows.append(name)
+                links.append((port, "o%d" % id(value)))
+                edges += 1
+
+            if total > shown:
+                rows.append("… %d more" % (total - shown))
+            # rows are named by index, ports must stay valid names
+            lab = self.label_htab_create(rows, title, "left",
+                                         self.deep_color(obj),
+                                         ["p%d" % i for i in range(len(rows))])
+            dot.node(node, label=lab)
+            for port, child in links:
+                dot.edge(':'.join([node, port]), child)
+
+        if self.deep_truncated is not None:
+            dot.node("truncated", label="truncated: %s\n%d nodes, %d edges"
+                     % (self.deep_truncated, len(names), edges),
+                     shape="note", style="filled", fillcolor="Salmon")
+            dot.edge("o%d" % id(root), "truncated", style="dashed")
+
+        return dot
+
+    def deepmap_create(self, filename="deep.gv", format="png", depth=3,
+                       max_nodes=500, max_edges=2000, max_time=5.0,
+                       max_rows=50, rankdir="LR", save_source=True):
+        dot = self.deep_dot(depth, max_nodes, max_edges, max_time, max_rows,
+                            rankdir)
+        return render(dot, filename, format, save_source)
+
+class FrameRecord(collections.namedtuple('FrameRecord',
+                                         'code filename lineno function')):
+    ''' a frame recorded by StackMap.capture, no frame is referenced and
+        the source line is only read when code_context is asked for '''
+    __slots__ = ()
+    index = 0
+
+    @property
+    def code_context(self):
+        line = linecache.getline(self.filename, self.lineno)
+        if not line:
+            return None
+        return [line]
 
 class StackMap():
     @staticmethod
+    def capture(skip=0, limit=None):
+        ''' stack of the caller, innermost first like inspect.stack(), but
+            frames are walked directly and only code, file, line number and
+            function are recorded. It's cheap enough for hot paths, the
+            result is drawn by draw_stack as well '''
+        frame = sys._getframe(skip + 1)
+        stack = []
+        while frame is not None:
+            if limit is not None and len(stack) >= limit:
+                break
+            code = frame.f_code
+            stack.append(FrameRecord(code, code.co_filename, frame.f_lineno,
+                                     code.co_name))
+            frame = frame.f_back
+
+        return stack
+
+    @staticmethod
+    @timed("labels")
     def label_stacktab_create(stack, align="left", color="SandyBrown"):
         tab_header = '''<<table border="0" cellborder="1" cellspacing="0">\n'''
         tab_tail = "</table>>\n"
@@ -455,9 +1188,13 @@ class StackMap():
              '</tr>\n'  % (color, "no", color, "file", color, "lineno", \
                            color, "function", color, "index")
     
-        trs = ""
+        trs = [tab_header, th]
         for i in stack:
-            frame,filename,lineno,funcname,lines,index = i
+            if isinstance(i, FrameRecord):
+                filename,lineno,funcname,index = i.filename, i.lineno, \
+                                                 i.function, i.index
+            else:
+                frame,filename,lineno,funcname,lines,index = i
             
             if filename.startswith("./"):
                 filename = filename[2:]
@@ -469,29 +1206,40 @@ class StackMap():
                  '<td align="%s">%s</td>'\
                  '<td align="%s">%s</td>'\
                  '<td align="%s">%s</td>'\
-                 '</tr>\n'  % (color, align, index_num, align, filename, align, \
-                               lineno, align, funcname, align, index)
+                 '</tr>\n'  % (color, align, index_num, align, escape(filename, False), \
+                               align, lineno, align, escape(funcname, False), align, index)
             index_num += 1
-            trs += tr
+            trs.append(tr)
      
-        return tab_header + th + trs + tab_tail
+        trs.append(tab_tail)
+        return ''.join(trs)
     
     # Rank directions: "TB", "LR", "BT", "RL"
     @classmethod
-    def draw_stack(cls, stack, filename="stack.gv", format="png", rankdir="TB"):
-        dot = Digraph('structs', node_attr={'shape': 'record'})
+    def stack_dot(cls, stack, name="stack.gv", rankdir="TB", dot=None):
+        ''' build the graphviz graph of stack without rendering it,
+            or add it to dot like a DotWriter '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'record'})
         dot.attr(rankdir=rankdir)
-        lab = cls.label_stacktab_create(stack)
-        dot.node(filename, label=lab, shape="plaintext")
-    
-        dot.render(filename, format=format, view=False)
-        dot.save()
+        with phase("build"):
+            lab = cls.label_stacktab_create(stack)
+            counted(dot).node(name, label=lab, shape="plaintext")
+        return dot
+
+    @classmethod
+    def draw_stack(cls, stack, filename="stack.gv", format="png", rankdir="TB",
+                   save_source=True):
+        dot = cls.stack_dot(stack, filename or "stack", rankdir)
+        return render(dot, filename, format, save_source)
 
 def test():
     import sample.sample
     objmap = ObjMap(sample.sample)
     objmap.objmap_create()
+    objmap.deepmap_create()
     StackMap.draw_stack(inspect.stack())
+    StackMap.draw_stack(StackMap.capture(), filename="stack_captured.gv")
 
 if __name__ == "__main__":
     test()
\ No newline at end of file
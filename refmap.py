@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+Referrer maps: the paths keeping an object alive, walked up with gc.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+try:
+    from .objmap import ObjMap, NodeType, member_kinds
+    from .render import Digraph, render
+except ImportError: # run as a script
+    from objmap import ObjMap, NodeType, member_kinds
+    from render import Digraph, render
+
+import collections
+import gc
+import inspect
+import sys
+import types
+import weakref
+
+# live indexes, their own containers are never reported as referrers
+_indexes = weakref.WeakSet()
+
+class RefIndex():
+    ''' reverse references of the whole heap in one snapshot: for every
+        object tracked by gc, the ids of the objects referring to it.
+        Built by one linear pass of gc.get_referents over gc.get_objects(),
+        so any number of RefMaps can share it instead of calling the
+        quadratic gc.get_referrers once per step. The index keeps the
+        snapshot alive, drop it to release the objects '''
+    def __init__(self):
+        frames = {id(i): i for i in self.live_frames()}
+        objects = gc.get_objects()
+        objects.extend(i for i in frames.values() if not gc.is_tracked(i))
+        ignore = set()
+        for i in _indexes:
+            ignore.update((id(i), id(i.__dict__), id(i.objects), id(i.referrers)))
+
+        referrers = {}
+        get_referents = gc.get_referents
+        for obj in objects:
+            oid = id(obj)
+            if oid in ignore:
+                continue
+            if frames.__contains__(oid):
+                referents = self.frame_referents(obj)
+            else:
+                referents = get_referents(obj)
+            for i in referents:
+                rid = id(i)
+                refs = referrers.get(rid)
+                if refs is None:
+                    referrers[rid] = [oid]
+                else:
+                    refs.append(oid)
+
+        # referrers are tracked objects, so all of them can be looked up
+        self.objects = dict(zip(map(id, objects), objects))
+        self.referrers = referrers
+        del objects, frames
+        _indexes.add(self)
+
+    @staticmethod
+    def live_frames():
+        ''' frames of the running functions of all threads. Since 3.11 they
+            are not gc objects until asked for, so they are added by hand,
+            less the ones of this module '''
+        frames = []
+        for frame in sys._current_frames().values():
+            while frame is not None:
+                if frame.f_globals is not globals():
+                    frames.append(frame)
+                frame = frame.f_back
+        return frames
+
+    @staticmethod
+    def frame_referents(frame):
+        ''' a running frame doesn't show its locals to gc, read them '''
+        referents = gc.get_referents(frame)
+        referents.extend(frame.f_locals.values())
+        if frame.f_back is not None:
+            referents.append(frame.f_back)
+        return referents
+
+    def __len__(self):
+        return len(self.objects)
+
+    def referrers_of(self, obj):
+        return [self.objects[i] for i in self.referrers.get(id(obj), ())]
+
+    def instances(self, clsinfo, limit=None):
+        ''' tracked instances of clsinfo and its subclasses '''
+        found = []
+        for i in self.objects.values():
+            if issubclass(type(i), clsinfo):
+                found.append(i)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+class RefMap():
+    ''' the retaining paths of an object: walk referrers upward breadth
+        first until modules or frames, and keep
+        the shortest path to each of those roots. With instances=True obj
+        is a class and the paths of its instances are walked together '''
+    root_types = (types.ModuleType, types.FrameType)
+
+    def __init__(self, obj, index=None, instances=False, limit=20):
+        self.root_node = obj
+        self.index = RefIndex() if index is None else index
+        if instances:
+            self.seeds = self.index.instances(obj, limit)
+        else:
+            self.seeds = [obj]
+        self.paths = None
+
+    def __ignored(self):
+        return {id(self), id(self.__dict__), id(self.seeds)}
+
+    @staticmethod
+    def isinternal_frame(frame):
+        return frame.f_globals is globals()
+
+    def isroot(self, obj):
+        return isinstance(obj, self.root_types)
+
+    def retaining_paths(self, max_depth=10, max_paths=20):
+        ''' list of paths, each a list of objects from a root down to one
+            of the seeds, shortest first. At most max_paths roots are
+            reached, nothing beyond max_depth steps is walked '''
+        objects = self.index.objects
+        referrers = self.index.referrers
+        ignore = self.__ignored()
+
+        # child toward the seeds of every visited object
+        parents = {id(i): None for i in self.seeds}
+        queue = collections.deque((i, 0) for i in self.seeds)
+        roots = []
+        while len(queue) and len(roots) < max_paths:
+            obj, level = queue.popleft()
+            if level >= max_depth:
+                continue
+
+            for rid in referrers.get(id(obj), ()):
+                if rid in ignore or parents.__contains__(rid):
+                    continue
+                ref = objects[rid]
+                if inspect.isframe(ref) and self.isinternal_frame(ref):
+                    continue
+                parents[rid] = obj
+                if self.isroot(ref):
+                    roots.append(ref)
+                    if len(roots) >= max_paths:
+                        break
+                else:
+                    queue.append((ref, level + 1))
+
+        paths = []
+        for root in roots:
+            path = [root]
+            while parents[id(path[-1])] is not None:
+                path.append(parents[id(path[-1])])
+            paths.append(path)
+        self.paths = paths
+        return paths
+
+    ''' how a referrer holds its referent '''
+    ref_attrs = ('__dict__', '__class__', '__self__', '__func__', '__closure__',
+                 '__defaults__', '__kwdefaults__', '__globals__', '__wrapped__',
+                 '__bases__', '__mro__', 'cell_contents', 'f_back', 'tb_frame',
+                 'gi_frame', 'cr_frame')
+
+    @classmethod
+    def ref_name(cls, src, dst):
+        if isinstance(src, dict):
+            for k, v in list(src.items()):
+                if v is dst:
+                    return "[%s]" % ObjMap.deep_short_repr(k)
+                if k is dst:
+                    return "key"
+        elif isinstance(src, (list, tuple)):
+            for i, v in enumerate(src):
+                if v is dst:
+                    return "[%d]" % i
+        elif isinstance(src, (set, frozenset)):
+            return "member"
+        elif inspect.isframe(src):
+            for k, v in list(src.f_locals.items()):
+                if v is dst:
+                    return k
+            if src.f_globals is dst:
+                return "f_globals"
+
+        for i in cls.ref_attrs:
+            try:
+                if getattr(src, i) is dst:
+                    return i
+            except Exception:
+                continue
+        try:
+            for k, v in list(vars(src).items()):
+                if v is dst:
+                    return k
+        except TypeError:
+            pass
+        return "ref"
+
+    @staticmethod
+    def node_title(obj):
+        if inspect.ismodule(obj):
+            return "module %s" % obj.__name__
+        if inspect.isframe(obj):
+            return "frame %s:%d" % (obj.f_code.co_name, obj.f_lineno)
+        if inspect.isclass(obj) or inspect.isroutine(obj):
+            return "%s %s" % (type(obj).__name__,
+                              getattr(obj, '__qualname__', obj.__name__))
+        return type(obj).__name__
+
+    @staticmethod
+    def node_color(obj):
+        if isinstance(obj, RefMap.root_types):
+            return ObjMap.hnode_styles[NodeType.root]['color']
+        for i in member_kinds(obj):
+            if ObjMap.hnode_styles.__contains__(i):
+                return ObjMap.hnode_styles[i]['color']
+        return ObjMap.hnode_styles[NodeType.obj]['color']
+
+    def refmap_dot(self, max_depth=10, max_paths=20, rankdir="TB", dot=None):
+        ''' build the graph of the retaining paths, roots on top and the
+            seeds at the bottom, each object drawn once as a table whose
+            row names the reference it holds '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'plaintext'})
+        dot.attr(rankdir=rankdir)
+
+        paths = self.retaining_paths(max_depth, max_paths)
+        seeds = set(id(i) for i in self.seeds)
+        drawn = set()
+        for path in paths:
+            for src, dst in zip(path, path[1:] + [None]):
+                node = "r%d" % id(src)
+                if id(src) in drawn:
+                    break # the rest of the path is drawn already
+                drawn.add(id(src))
+
+                if dst is None:
+                    rows = [ObjMap.deep_short_repr(src)]
+                else:
+                    rows = [self.ref_name(src, dst)]
+                color = "red" if id(src) in seeds else self.node_color(src)
+                lab = ObjMap.label_htab_create(rows, self.node_title(src),
+                                               "left", color, ["p0"])
+                dot.node(node, label=lab)
+                if dst is not None:
+                    dot.edge(node + ":p0", "r%d" % id(dst))
+
+        if len(paths) == 0:
+            for i in self.seeds:
+                lab = ObjMap.label_htab_create(["no retaining path found"],
+                                               self.node_title(i), "left", "red")
+                dot.node("r%d" % id(i), label=lab)
+        return dot
+
+    # filename None returns the image data instead of writing files
+    def refmap_create(self, filename="refs.gv", format="png", max_depth=10,
+                      max_paths=20, rankdir="TB", save_source=True):
+        dot = self.refmap_dot(max_depth, max_paths, rankdir)
+        return render(dot, filename, format, save_source)
+
+def test():
+    import sample.sample
+    index = RefIndex()
+    RefMap(sample.sample.A, index).refmap_create()
+    RefMap(sample.sample.A, index, instances=True).refmap_create("inst.gv")
+
+if __name__ == '__main__':
+    test()
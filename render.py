@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rendering helpers shared by ClsMap, ObjMap and StackMap.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+try:
+    from .stats import count, phase, timed
+except ImportError: # run as a script
+    from stats import count, phase, timed
+
+from collections import OrderedDict
+
+import os
+import threading
+
+# graphviz, asyncio and the like are imported on first use, so extracting
+# edges never pays for the rendering side
+
+def Digraph(*args, **kwargs):
+    ''' a graphviz.Digraph, graphviz is imported by the first map built '''
+    from graphviz import Digraph
+    return Digraph(*args, **kwargs)
+
+class RenderJob():
+    ''' a map to render, dot is a graphviz graph or a callable building it
+        like ClsMap.map_dot, which is called with args and kwargs '''
+    def __init__(self, dot, filename, format="png", args=(), kwargs=None,
+                 save_source=True):
+        self.dot = dot
+        self.filename = filename
+        self.format = format
+        self.save_source = save_source
+        self.args = args
+        self.kwargs = kwargs or {}
+
+    def build(self):
+        if callable(self.dot):
+            return self.dot(*self.args, **self.kwargs)
+        return self.dot
+
+class RenderResult():
+    ''' output is the rendered file path (image data if job filename is
+        None), error is the exception if failed '''
+    def __init__(self, job, output=None, error=None):
+        self.job = job
+        self.output = output
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            if self.job.filename is None:
+                return "<RenderResult %d bytes ok>" % len(self.output)
+            return "<RenderResult %s ok>" % self.output
+        return "<RenderResult %s failed: %r>" % (self.job.filename, self.error)
+
+''' formats returned as text by in-memory rendering '''
+TEXT_FORMATS = ('svg', 'dot', 'xdot', 'plain', 'json')
+
+class RenderCache():
+    ''' rendered images keyed by the sha256 of the dot source, format,
+        engine and renderer options, so an unchanged map skips the layout.
+        Images are files under directory, the least recently used ones are
+        removed once they hold more than max_bytes, directory None keeps
+        no files. memory_bytes > 0 adds an in-process tier before the
+        disk. A cache can be shared by threads and processes '''
+    def __init__(self, directory=None, max_bytes=256 << 20, memory_bytes=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__memory = OrderedDict()
+        self.__memory_used = 0
+        self.__disk_used = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for i in os.scandir(directory):
+                if i.is_file():
+                    self.__disk_used += i.stat().st_size
+
+    @staticmethod
+    def key(dot, format):
+        import hashlib
+        h = hashlib.sha256()
+        for i in (dot.engine, format, getattr(dot, 'renderer', None),
+                  getattr(dot, 'formatter', None)):
+            h.update(str(i).encode('utf-8'))
+            h.update(b'\0')
+        h.update(dot.source.encode(dot.encoding))
+        return h.hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        ''' the image data of key, None if not cached '''
+        with self.__lock:
+            data = self.__memory.get(key)
+            if data is not None:
+                self.__memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = None
+        if self.directory is not None:
+            try:
+                with open(self.__path(key), 'rb') as f:
+                    data = f.read()
+                os.utime(self.__path(key)) # recently used
+            except OSError:
+                data = None
+
+        with self.__lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.__memory_put(key, data)
+        return data
+
+    def put(self, key, data):
+        self.__memory_put(key, data)
+        if self.directory is None:
+            return
+
+        # write aside then rename, readers never see half a file
+        tmp = self.__path("%s.%d.%d.tmp" % (key, os.getpid(),
+                                            threading.get_ident()))
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.__path(key))
+        except OSError as e:
+            print("Warn:", "render cache write failed,", e)
+            return
+
+        with self.__lock:
+            self.__disk_used += len(data)
+            if self.__disk_used > self.max_bytes:
+                self.__evict()
+
+    def __memory_put(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self.__lock:
+            if self.__memory.__contains__(key):
+                return
+            self.__memory[key] = data
+            self.__memory_used += len(data)
+            while self.__memory_used > self.memory_bytes:
+                self.__memory_used -= len(self.__memory.popitem(last=False)[1])
+
+    def __evict(self):
+        ''' remove least recently used files down to 3/4 of max_bytes,
+            sizes are recounted as other processes share the directory '''
+        files = []
+        for i in os.scandir(self.directory):
+            try:
+                st = i.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, i.path))
+        files.sort()
+
+        used = sum(i[1] for i in files)
+        for mtime, size, path in files:
+            if used <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            used -= size
+        self.__disk_used = used
+
+    def clear(self):
+        with self.__lock:
+            self.__memory.clear()
+            self.__memory_used = 0
+            if self.directory is not None:
+                for i in os.scandir(self.directory):
+                    try:
+                        os.remove(i.path)
+                    except OSError:
+                        pass
+            self.__disk_used = 0
+
+_cache = None
+
+def set_cache(cache):
+    ''' render through cache, a RenderCache, from now on; None stops
+        caching. Return the cache used before '''
+    global _cache
+    old = _cache
+    _cache = cache
+    return old
+
+def get_cache():
+    return _cache
+
+def _pipe(dot, format):
+    cache = _cache
+    if cache is None:
+        return dot.pipe(format=format)
+
+    key = cache.key(dot, format)
+    data = cache.get(key)
+    if data is None:
+        data = dot.pipe(format=format)
+        cache.put(key, data)
+    else:
+        count("render_cache_hits")
+    return data
+
+@timed("render")
+def render(dot, filename, format="png", save_source=True):
+    ''' render dot to filename.format and keep its source in filename.
+        If filename is None nothing touches the disk, graphviz is piped
+        by stdin/stdout and the image bytes (or text like svg) returned.
+        With save_source False only the image file is written.
+        Images come from the render cache if one is set '''
+    count("renders")
+    if filename is None:
+        data = _pipe(dot, format)
+        if format in TEXT_FORMATS:
+            return data.decode('utf-8')
+        return data
+
+    if _cache is None and save_source:
+        return dot.render(filename, format=format, view=False)
+
+    if save_source:
+        dot.save(filename)
+    output = '.'.join([filename, format])
+    data = _pipe(dot, format)
+    with open(output, 'wb') as f:
+        f.write(data)
+    return output
+
+def render_job(job):
+    try:
+        dot = job.build()
+        if dot is None:
+            raise ValueError("nothing to render for %s" % job.filename)
+        return RenderResult(job, render(dot, job.filename, job.format,
+                                        job.save_source))
+    except Exception as e:
+        return RenderResult(job, error=e)
+
+def render_batch(jobs, workers=None):
+    ''' render many maps by a bounded thread pool. Layouts run in their own
+        dot processes, so threads are enough to keep all cores busy.
+        Return a RenderResult for every job in jobs order, a failed job
+        doesn't stop the others '''
+    from concurrent.futures import ThreadPoolExecutor
+    import contextvars
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # every job runs in a copy of the caller's context, like its MapStats
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, render_job, i)
+                   for i in jobs]
+        return [i.result() for i in futures]
+
+class AsyncRenderer():
+    ''' render maps from asyncio code, layouts run in asyncio subprocesses
+        so the event loop is never blocked. At most limit layouts run at
+        the same time, a layout running longer than timeout seconds is
+        killed, and so is the layout of a cancelled render '''
+    def __init__(self, limit=None, timeout=None):
+        self.limit = limit or os.cpu_count() or 1
+        self.timeout = timeout
+        self.__semaphore = None
+
+    async def __layout(self, dot, format, timeout):
+        import asyncio
+        import subprocess
+        cmd = [dot.engine, '-T' + format]
+        proc = await asyncio.create_subprocess_exec(*cmd,
+                                                    stdin=subprocess.PIPE,
+                                                    stdout=subprocess.PIPE,
+                                                    stderr=subprocess.PIPE)
+        try:
+            out, err = await asyncio.wait_for(
+                proc.communicate(dot.source.encode(dot.encoding)), timeout)
+        except BaseException: # timeout or cancelled
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+            raise
+
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd,
+                                                output=out, stderr=err)
+        return out
+
+    @staticmethod
+    def __write(dot, filename, format, data, save_source):
+        if save_source:
+            with open(filename, 'w', encoding=dot.encoding) as f:
+                f.write(dot.source)
+
+        output = '.'.join([filename, format])
+        with open(output, 'wb') as f:
+            f.write(data)
+        return output
+
+    async def render(self, dot, filename=None, format="png", save_source=True,
+                     timeout=None):
+        ''' async render(), the image data is returned if filename is None '''
+        import asyncio
+        count("renders")
+        if self.__semaphore is None: # bound to the running loop
+            self.__semaphore = asyncio.Semaphore(self.limit)
+        if timeout is None:
+            timeout = self.timeout
+
+        cache = _cache
+        loop = asyncio.get_running_loop()
+        data = None
+        if cache is not None:
+            key = cache.key(dot, format)
+            data = await loop.run_in_executor(None, cache.get, key)
+            if data is not None:
+                count("render_cache_hits")
+
+        if data is None:
+            async with self.__semaphore:
+                with phase("render"):
+                    data = await self.__layout(dot, format, timeout)
+            if cache is not None:
+                await loop.run_in_executor(None, cache.put, key, data)
+
+        if filename is None:
+            if format in TEXT_FORMATS:
+                return data.decode('utf-8')
+            return data
+
+        return await loop.run_in_executor(None, self.__write, dot, filename,
+                                          format, data, save_source)
+
+    async def render_job(self, job, timeout=None):
+        ''' build job's graph in the default executor, then render it, the
+            async variant of render_job() '''
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+            dot = await loop.run_in_executor(None, job.build)
+            if dot is None:
+                raise ValueError("nothing to render for %s" % job.filename)
+            output = await self.render(dot, job.filename, job.format,
+                                       job.save_source, timeout)
+            return RenderResult(job, output)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return RenderResult(job, error=e)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sampling profiler aggregating the stacks of all threads into a call tree
+drawn like StackMap.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+from html import escape
+
+import os
+import sys
+import threading
+import time
+
+try:
+    from .clsmap import CPicker
+    from .objmap import FrameRecord
+    from .render import Digraph, render
+except ImportError: # run as a script
+    from clsmap import CPicker
+    from objmap import FrameRecord
+    from render import Digraph, render
+
+class CallNode():
+    ''' a function in the call tree, count is the number of samples the
+        function was on the stack, self_count the ones it was running '''
+    __slots__ = ('code', 'lineno', 'children', 'count', 'self_count')
+
+    def __init__(self, code=None, lineno=0):
+        self.code = code
+        self.lineno = lineno
+        self.children = {}
+        self.count = 0
+        self.self_count = 0
+
+    @property
+    def name(self):
+        if self.code is None:
+            return "all threads"
+        return self.code.co_name.strip('<>')
+
+class StackSampler():
+    ''' sample stacks of all threads (or only threads, a set of thread
+        idents) every interval seconds by sys._current_frames and merge
+        them into one call tree. Sampling slows down when it costs more
+        than max_overhead of the wall time, sample_time and overhead tell
+        what it actually cost '''
+    def __init__(self, interval=0.01, max_overhead=0.02, threads=None):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.threads = threads
+        self.root = CallNode()
+        self.samples = 0
+        self.sample_time = 0.0
+        self.started = None
+        self.stopped = None
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    @property
+    def overhead(self):
+        ''' part of the wall time spent in sampling '''
+        if self.started is None:
+            return 0.0
+        elapsed = (self.stopped or time.perf_counter()) - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.sample_time / elapsed
+
+    def sample(self):
+        ''' take one sample of all threads now '''
+        start = time.perf_counter()
+        own = threading.get_ident()
+        frames = sys._current_frames()
+
+        with self.__lock:
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if self.threads is not None and ident not in self.threads:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+
+                node = self.root
+                node.count += 1
+                for code, lineno in reversed(stack):
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    child = node.children.get(key)
+                    if child is None:
+                        child = node.children[key] = CallNode(code, lineno)
+                    child.lineno = lineno
+                    child.count += 1
+                    node = child
+                node.self_count += 1
+
+            self.samples += 1
+        del frames
+
+        cost = time.perf_counter() - start
+        self.sample_time += cost
+        return cost
+
+    def __run(self):
+        while not self.__stop.is_set():
+            cost = self.sample()
+            # keep cost / (cost + wait) under max_overhead
+            wait = max(self.interval - cost,
+                       cost * (1 - self.max_overhead) / self.max_overhead)
+            self.__stop.wait(wait)
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.started = time.perf_counter()
+        self.stopped = None
+        self.__thread = threading.Thread(target=self.__run,
+                                         name="StackSampler", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+        self.stopped = time.perf_counter()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def hot_path(self):
+        ''' call nodes from the root following the most sampled child '''
+        path = []
+        with self.__lock:
+            node = self.root
+            while len(node.children):
+                node = max(node.children.values(), key=lambda i: i.count)
+                path.append(node)
+        return path
+
+    def hot_stack(self):
+        ''' the hot path as a stack, innermost first, for StackMap.draw_stack '''
+        return [FrameRecord(i.code, i.code.co_filename, i.lineno, i.code.co_name)
+                for i in reversed(self.hot_path())]
+
+    @staticmethod
+    def label_calltab_create(node, total, color):
+        filename = node.code.co_filename
+        if filename.startswith("./"):
+            filename = filename[2:]
+
+        return '''<<table border="0" cellborder="1" cellspacing="0">
+\t<tr><td bgcolor="%s"><b><i>%s</i></b></td></tr>
+\t<tr><td align="left">%s:%d</td></tr>
+\t<tr><td align="left">%d samples %.1f%%, self %d</td></tr>
+</table>>''' % (color, escape(node.name, False),
+                escape(os.path.basename(filename), False),
+                node.code.co_firstlineno, node.count,
+                100.0 * node.count / total, node.self_count)
+
+    # Rank directions: "TB", "LR", "BT", "RL"
+    def tree_dot(self, min_fraction=0.01, rankdir="TB", dot=None):
+        ''' build the call tree graph, functions in less than min_fraction
+            of the samples are left out, the hot path is drawn red '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'plaintext'})
+        dot.attr(rankdir=rankdir)
+
+        hot = set(id(i) for i in self.hot_path())
+        with self.__lock:
+            total = max(self.root.count, 1)
+            dot.node("n%d" % id(self.root), label="all threads\n%d samples"
+                     % self.samples, shape="box", style="filled",
+                     fillcolor=CPicker.ylorbr9[0])
+
+            stack = [self.root]
+            while len(stack):
+                parent = stack.pop()
+                for node in parent.children.values():
+                    if node.count < min_fraction * total:
+                        continue
+                    heat = CPicker.ylorbr9[min(8, int(9.0 * node.count / total))]
+                    dot.node("n%d" % id(node),
+                             label=self.label_calltab_create(node, total, heat))
+                    if id(node) in hot:
+                        dot.edge("n%d" % id(parent), "n%d" % id(node),
+                                 color="red", penwidth="2")
+                    else:
+                        dot.edge("n%d" % id(parent), "n%d" % id(node))
+                    stack.append(node)
+
+        return dot
+
+    def draw_tree(self, filename="profile.gv", format="png", min_fraction=0.01,
+                  rankdir="TB", save_source=True):
+        dot = self.tree_dot(min_fraction, rankdir)
+        return render(dot, filename, format, save_source)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shallow and retained object sizes for memory annotated maps.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import gc
+import sys
+import types
+
+''' shared by everything, a retained size never follows them '''
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType,
+                types.BuiltinFunctionType, types.CodeType, types.FrameType)
+
+def size_str(size):
+    ''' 1536 -> '1.5K' '''
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024 or unit == 'G':
+            break
+        size /= 1024.0
+    if unit == 'B':
+        return "%d%s" % (size, unit)
+    return "%.1f%s" % (size, unit)
+
+class SizeIndex():
+    ''' shallow (sys.getsizeof) and estimated retained sizes of objects.
+        The retained size of an object is the sum of all objects reached
+        from it by gc.get_referents, walked level by level in batches.
+        Every object is counted once for the whole index: whoever reaches
+        it first owns it, so sizes of map rows never overlap. Classes,
+        modules and functions are shared and not followed, nor are the
+        objects in exclude, like the mapped root itself '''
+    def __init__(self, exclude=()):
+        self.__shallow = {}
+        self.__retained = {}
+        self.__claimed = set(id(i) for i in exclude)
+        self.__keep = list(exclude) # keep objects alive, so ids stay unique
+        for i in list(sys.modules.values()):
+            namespace = getattr(i, '__dict__', None)
+            if namespace is not None:
+                self.__claimed.add(id(namespace))
+                self.__keep.append(namespace)
+        self.__excluded = frozenset(self.__claimed)
+
+    def shallow(self, obj):
+        key = id(obj)
+        size = self.__shallow.get(key)
+        if size is None:
+            size = self.__shallow[key] = sys.getsizeof(obj, 0)
+            self.__keep.append(obj)
+        return size
+
+    def retained(self, obj):
+        ''' bytes kept alive by obj and not owned by another object yet '''
+        key = id(obj)
+        size = self.__retained.get(key)
+        if size is not None:
+            return size
+        if key in self.__claimed:
+            self.__retained[key] = 0
+            self.__keep.append(obj)
+            return 0
+
+        # objects below obj live as long as obj, only obj is kept
+        size = self.__walk(obj, self.__claimed)
+        self.__retained[key] = size
+        self.__keep.append(obj)
+        return size
+
+    def reachable(self, obj):
+        ''' bytes reached from obj whether other objects reach them too,
+            so the size of obj doesn't depend on what was sized before.
+            Not cached, nor does it claim anything '''
+        if id(obj) in self.__excluded:
+            return 0
+        return self.__walk(obj, set(self.__excluded))
+
+    @staticmethod
+    def __walk(obj, claimed):
+        claimed.add(id(obj))
+        size = 0
+        level = [obj]
+        while len(level):
+            size += sum(sys.getsizeof(i, 0) for i in level)
+            nextlevel = []
+            for i in gc.get_referents(*level):
+                if id(i) not in claimed and not isinstance(i, SHARED_TYPES):
+                    claimed.add(id(i))
+                    nextlevel.append(i)
+            level = nextlevel
+        return size
+
+def test():
+    class Broken():
+        def __sizeof__(self):
+            raise TypeError("no size")
+
+    # a failing __sizeof__ counts as 0, it must not break the walk
+    holder = {"broken": Broken(), "data": list(range(10))}
+    index = SizeIndex()
+    assert index.shallow(holder["broken"]) == 0
+    assert index.reachable(holder) >= sys.getsizeof(holder["data"])
+    assert index.retained(holder) >= sys.getsizeof(holder["data"])
+    print("ok")
+
+if __name__ == '__main__':
+    test()
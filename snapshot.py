@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+Snapshots of ObjMap and ClsMap models and the maps of their differences.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+try:
+    from .objmap import ObjMap, NodeType
+    from .render import Digraph, render
+    from .sizes import SizeIndex, size_str
+except ImportError: # run as a script
+    from objmap import ObjMap, NodeType
+    from render import Digraph, render
+    from sizes import SizeIndex, size_str
+
+import sys
+import time
+
+class Snapshot():
+    ''' a compact summary of a map at one moment: for every (section, name)
+        the hash of its type plus its item count and bytes. No member is
+        referenced, so snapshots are cheap to keep between requests.
+        Hashes come from hash(), compare snapshots of one process only '''
+    def __init__(self, title):
+        self.title = title
+        self.taken = time.time()
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def __type_hash(value):
+        typ = type(value)
+        return hash((typ.__module__, typ.__qualname__))
+
+    @staticmethod
+    def __count(value):
+        if isinstance(value, (str, bytes)):
+            return 1
+        try:
+            return len(value)
+        except Exception:
+            return 1
+
+    @classmethod
+    def of_obj(cls, obj, sizes=False):
+        ''' summarize the rows of obj's map, each member in the first table
+            ObjMap draws it in. Sizes are the bytes each member reaches if
+            sizes is True, shallow ones otherwise '''
+        objmap = ObjMap(obj)
+        snap = cls(getattr(obj, '__name__', type(obj).__name__))
+        members = objmap.members(obj)
+        values = members.values
+
+        # the top tables of the map, so the snapshot holds what it shows
+        sections = []
+        seen = set()
+        for nodetype, style in objmap.hnode_styles.items():
+            if nodetype == NodeType.root:
+                continue
+            names = [i for i in style['get_nodes'](objmap, obj)
+                     if not seen.__contains__(i)]
+            seen.update(names)
+            sections.append((style['title'], names))
+
+        if sizes:
+            sizeof = SizeIndex(exclude=[obj]).reachable
+        else:
+            sizeof = sys.getsizeof
+        # every member is sized on its own, what members share is counted
+        # in each, so a member's size only changes when the member does
+        for title, names in sections:
+            for name in names:
+                if objmap.isprivate_name(name):
+                    continue
+                value = values[name]
+                snap.entries[(title, name)] = (cls.__type_hash(value),
+                                               cls.__count(value),
+                                               sizeof(value))
+        return snap
+
+    @classmethod
+    def of_cls(cls, clsinfo, census=None):
+        ''' summarize clsinfo and all its subclasses, with the instance
+            counts and bytes of a census.Census if one is given '''
+        snap = cls(clsinfo.__name__)
+        seen = {id(clsinfo)}
+        stack = [clsinfo]
+        while len(stack):
+            i = stack.pop()
+            name = '.'.join([i.__module__, i.__qualname__])
+            bases = tuple('.'.join([j.__module__, j.__qualname__])
+                          for j in i.__bases__)
+            if census is None:
+                stats = (0, 0)
+            else:
+                stats = (census.count(i), census.size(i))
+            snap.entries[("classes", name)] = (hash(bases),) + stats
+
+            for j in type.__subclasses__(i):
+                if id(j) not in seen:
+                    seen.add(id(j))
+                    stack.append(j)
+        return snap
+
+    def diff(self, newer):
+        return SnapshotDiff(self, newer)
+
+class SnapshotDiff():
+    ''' what changed from older to newer, in one pass over both snapshots.
+        added and removed are keys, changed maps keys to
+        (retyped, count delta, bytes delta) '''
+    def __init__(self, older, newer):
+        self.older = older
+        self.newer = newer
+        self.added = []
+        self.removed = []
+        self.changed = {}
+
+        old = older.entries
+        for key, entry in newer.entries.items():
+            before = old.get(key)
+            if before is None:
+                self.added.append(key)
+            elif before != entry:
+                self.changed[key] = (before[0] != entry[0],
+                                     entry[1] - before[1], entry[2] - before[2])
+        new = newer.entries
+        for key in old:
+            if not new.__contains__(key):
+                self.removed.append(key)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def growth(self):
+        ''' bytes added minus bytes removed '''
+        total = sum(self.newer.entries[i][2] for i in self.added)
+        total -= sum(self.older.entries[i][2] for i in self.removed)
+        total += sum(i[2] for i in self.changed.values())
+        return total
+
+    @staticmethod
+    def __delta_str(count, size):
+        parts = []
+        if count:
+            parts.append("%+d items" % count)
+        if size:
+            parts.append(("+" if size > 0 else "-") + size_str(abs(size)))
+        return ' '.join(parts)
+
+    def __sections(self):
+        ''' {section: [(kind, row)]}, kinds are added, removed, changed '''
+        sections = {}
+        for section, name in sorted(self.added):
+            entry = self.newer.entries[(section, name)]
+            sections.setdefault(section, []).append(
+                ("added", "+ %s %s" % (name, size_str(entry[2]))))
+        for section, name in sorted(self.removed):
+            entry = self.older.entries[(section, name)]
+            sections.setdefault(section, []).append(
+                ("removed", "- %s %s" % (name, size_str(entry[2]))))
+        for section, name in sorted(self.changed):
+            retyped, count, size = self.changed[(section, name)]
+            row = "~ %s %s" % (name, self.__delta_str(count, size))
+            if retyped:
+                row += " (type changed)"
+            sections.setdefault(section, []).append(("changed", row))
+        return sections
+
+    diff_colors = {"added": "#b3de69", "removed": "#fb8072", "changed": "#ffffb3"}
+
+    def diff_dot(self, rankdir="LR", dot=None):
+        ''' a root node with the totals linked to one table per section,
+            rows colored by the kind of change '''
+        if dot is None:
+            dot = Digraph('structs', node_attr={'shape': 'plaintext'})
+        dot.attr(rankdir=rankdir)
+
+        rows = ["%d added" % len(self.added), "%d removed" % len(self.removed),
+                "%d changed" % len(self.changed),
+                "growth %s" % self.__delta_str(0, self.growth())]
+        title = "%s: %.1fs" % (self.newer.title,
+                               self.newer.taken - self.older.taken)
+        dot.node("diff", label=ObjMap.label_htab_create(rows, title, "left",
+                 ObjMap.hnode_styles[NodeType.root]['color']))
+
+        for n, (section, items) in enumerate(sorted(self.__sections().items())):
+            node = "s%d" % n
+            lab = ObjMap.label_htab_create([i[1] for i in items], section,
+                      "left", "SandyBrown",
+                      ["p%d" % i for i in range(len(items))],
+                      [self.diff_colors[i[0]] for i in items])
+            dot.node(node, label=lab)
+            dot.edge("diff", node)
+        return dot
+
+    # filename None returns the image data instead of writing files
+    def draw_diff(self, filename="diff.gv", format="png", rankdir="LR",
+                  save_source=True):
+        dot = self.diff_dot(rankdir)
+        return render(dot, filename, format, save_source)
+
+def test():
+    import sample.sample
+    before = Snapshot.of_obj(sample.sample, sizes=True)
+    sample.sample.sample_list.extend(range(100))
+    sample.sample.added_dict = {i: str(i) for i in range(10)}
+    del sample.sample.sample_tuple
+    after = Snapshot.of_obj(sample.sample, sizes=True)
+    before.diff(after).draw_diff()
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Phase timers and counters of map builds, enabled per context.
+
+Copyright (c) 2017-2018 Red Liu <lli_njupt@163.com>
+
+Released under the MIT licence.
+"""
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+
+_current = contextvars.ContextVar('objmap_stats', default=None)
+_disabled = contextlib.nullcontext()
+
+class MapStats():
+    ''' phase times in seconds and counters of the maps built while it's
+        entered, in this thread or asyncio task only:
+
+            with MapStats() as stats:
+                ObjMap(obj).objmap_create()
+            print(stats.report())
+
+        Phases: members, labels, edges, build, render. Counters:
+        getmembers, getattr, nodes, edges, label_bytes, renders,
+        render_cache_hits. Every hook is called as hook(stats, kind, name,
+        value), kind "time" or "count", to forward numbers elsewhere.
+        Phases nest: members and labels are parts of build '''
+    def __init__(self, hooks=()):
+        self.times = {}
+        self.counts = {}
+        self.hooks = list(hooks)
+        self.__tokens = []
+        self.__lock = threading.Lock() # render_batch threads share it
+
+    def __enter__(self):
+        self.__tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self.__tokens.pop())
+
+    def add(self, counter, n=1):
+        with self.__lock:
+            self.counts[counter] = self.counts.get(counter, 0) + n
+        for hook in self.hooks:
+            hook(self, "count", counter, n)
+
+    def add_time(self, phase, seconds):
+        with self.__lock:
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+        for hook in self.hooks:
+            hook(self, "time", phase, seconds)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def as_dict(self):
+        return {"times" : dict(self.times), "counts" : dict(self.counts)}
+
+    def report(self):
+        lines = ["%-18s %10.3f ms" % (k, v * 1000)
+                 for k, v in sorted(self.times.items())]
+        lines.extend("%-18s %10d" % (k, v) for k, v in sorted(self.counts.items()))
+        return '\n'.join(lines)
+
+''' instrumentation points, a lookup and a None check when disabled '''
+def current():
+    return _current.get()
+
+def count(counter, n=1):
+    stats = _current.get()
+    if stats is not None:
+        stats.add(counter, n)
+
+def phase(name):
+    stats = _current.get()
+    if stats is None:
+        return _disabled
+    return stats.phase(name)
+
+class CountingDot():
+    ''' a graph passing everything to dot, counting nodes, edges and
+        label bytes on the way '''
+    def __init__(self, dot, stats):
+        self.__dot = dot
+        self.__stats = stats
+
+    def node(self, name, label=None, *args, **kwargs):
+        self.__stats.add("nodes")
+        if label is not None:
+            self.__stats.add("label_bytes", len(label))
+        return self.__dot.node(name, label, *args, **kwargs)
+
+    def edge(self, *args, **kwargs):
+        self.__stats.add("edges")
+        return self.__dot.edge(*args, **kwargs)
+
+    def edges(self, tail_head_iter):
+        edges = list(tail_head_iter)
+        self.__stats.add("edges", len(edges))
+        return self.__dot.edges(edges)
+
+    def __getattr__(self, name):
+        return getattr(self.__dot, name)
+
+def counted(dot):
+    ''' dot itself when disabled, else dot wrapped by a CountingDot '''
+    stats = _current.get()
+    if stats is None:
+        return dot
+    return CountingDot(dot, stats)
+
+def timed(name):
+    ''' decorator adding the time of every call to phase name '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator